@@ -1,10 +1,14 @@
 import sys
 from re import findall, split
 from collections import deque
+from typing import Callable
 import mido
 import numpy as np
 import moviepy as me
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 plt.rcParams['font.family'] = 'Sarasa Mono SC'
 plt.rcParams['font.size'] = 10.5  # 10.5pt 五号字；9pt 小五号字
@@ -559,6 +563,293 @@ class Movie():
     # endregion
 
 
+# region NoteIndex
+class NoteIndex():
+    '''
+    单条轨道音符表的区间查询索引
+
+    音符按开始时间排序，并记录排序后结束时间的前缀最大值。
+    开始时间早于查询终点的音符是排序后的一段前缀，
+    其中前缀最大值首次超过查询起点之前的音符都已经结束，
+    因此只需在剩下的候选音符上按原条件判断
+    '''
+
+    def __init__(self, mtrack: np.ndarray) -> None:
+        self.mtrack = mtrack
+        self.order = np.argsort(mtrack[:, 2], kind='stable')
+        self.starts = mtrack[self.order, 2]
+        self.max_ends = np.maximum.accumulate(mtrack[self.order, 3]) if (
+            len(mtrack)
+            ) else mtrack[:0, 3]
+
+    def query(
+            self,
+            start: float,
+            end: float,
+            low: float,
+            high: float
+        ) -> np.ndarray:
+        '''
+        选出终点在start之后、起点在end之前、音高在 (low, high) 之间的音符，
+        结果及其顺序与对整张表做布尔筛选完全一致
+        '''
+        # 查询值先舍入到表的精度，并取闭区间，保证候选是原条件结果的超集
+        dtype = self.starts.dtype.type
+        i1 = np.searchsorted(self.starts, dtype(end), 'right')
+        i0 = np.searchsorted(self.max_ends[:i1], dtype(start), 'left')
+        candidates = self.mtrack[np.sort(self.order[i0:i1])]
+        return candidates[(candidates[:, 3] > start)
+                          & (candidates[:, 2] < end)
+                          & (candidates[:, 0] > low)
+                          & (candidates[:, 0] < high)]
+    # endregion
+
+
+# region FigurePool
+def axes_artists(ax: plt.Axes) -> list:
+    '''
+    坐标轴上由绘图命令添加的图元（不含刻度、边框等坐标轴自身的部件）
+    '''
+    return [
+        *ax.artists, *ax.collections, *ax.images, *ax.lines, *ax.patches,
+        *ax.tables, *ax.texts
+        ]
+
+
+def remove_artists(ax: plt.Axes, keep: set = frozenset()):
+    '''
+    通过 `remove` 移除坐标轴上keep以外的容器、图元与图例，
+    图元对坐标轴的引用与重绘标记由matplotlib一并处理
+    '''
+    # 先移除容器，容器会连同其中的图元一起移除
+    for container in list(ax.containers):
+        if container not in keep:
+            container.remove()
+    for artist in axes_artists(ax):
+        if artist not in keep:
+            artist.remove()
+    if None is not ax.legend_:
+        ax.legend_.remove()
+
+
+class FigurePool():
+    '''
+    可复用的figure池
+
+    每张figure由 `factory` 建立一次（键盘、背景栏与网格等固定内容只绘制一次），
+    同时记录此时各坐标轴上的图元；归还时移除记录以外的图元即可清除段落相关的内容，
+    不再关闭并重建figure。
+    figure使用面向对象的Agg接口，不经过pyplot的全局状态，
+    同时存在的多个片段各自持有一张figure，互不影响
+    '''
+
+    def __init__(self, factory: Callable[[], tuple], size: int = 0) -> None:
+        '''
+        Parameters
+        ---
+        factory:
+            - 建立figure的函数，返回值的第一项为figure
+        size:
+            - 预先建立的figure数量
+        '''
+        self.factory = factory
+        self._idle: list[tuple] = []
+        self._snapshots: dict[int, list[tuple[plt.Axes, set]]] = {}
+        for _ in range(size):
+            self._idle.append(self._build())
+
+    def _build(self) -> tuple:
+        figure = self.factory()
+        self._snapshots[id(figure[0])] = [
+            (ax, {*axes_artists(ax), *ax.containers})
+            for ax in figure[0].axes
+            ]
+        return figure
+
+    @property
+    def n_figures(self) -> int:
+        '''
+        已建立的figure总数
+        '''
+        return len(self._snapshots)
+
+    def acquire(self) -> tuple:
+        '''
+        取出一张空闲的figure，没有时新建
+        '''
+        return self._idle.pop() if self._idle else self._build()
+
+    def release(self, figure: tuple):
+        '''
+        清除段落相关的图元后归还figure
+        '''
+        fig: Figure = figure[0]
+        if any(fig is f[0] for f in self._idle):
+            return
+        for ax, static in self._snapshots[id(fig)]:
+            remove_artists(ax, static)
+        self._idle.append(figure)
+
+    def frame_size(self) -> tuple[int, int]:
+        '''
+        figure的画面尺寸 (w, h)
+        '''
+        figure = self.acquire()
+        size = figure[0].canvas.get_width_height(physical=True)
+        self.release(figure)
+        return size
+
+
+class FigureClip(me.VideoClip):
+    '''
+    使用池中figure绘制的片段
+
+    第一次取帧时才从池中取出figure并调用 `setup` 绘制段落内容，
+    `close` 后归还figure，之后再取帧会重新取出并绘制。
+    `with_*` 得到的副本共用同一份绑定，关闭其中任意一个即可归还
+    '''
+
+    def __init__(
+            self,
+            setup: Callable[[tuple], Callable],
+            pool: FigurePool,
+            duration: float = None
+        ) -> None:
+        '''
+        Parameters
+        ---
+        setup:
+            - 在取出的figure上绘制段落内容，返回逐帧函数 frame_function(t)
+        pool:
+            - figure所属的池
+        duration:
+            - 片段时长
+        '''
+        # 不把逐帧函数交给父类，避免其为了获取尺寸提前取出figure
+        super().__init__(duration=duration)
+        self.pool = pool
+        self.setup = setup
+        self.size = pool.frame_size()
+        # [figure, frame_function]，副本之间共用
+        binding = self._binding = [None, None]
+
+        def frame_function(t: float) -> np.ndarray:
+            if None is binding[0]:
+                binding[0] = pool.acquire()
+                binding[1] = setup(binding[0])
+            return binding[1](t)
+
+        self.frame_function = frame_function
+
+    def close(self):
+        if None is not self._binding[0]:
+            self.pool.release(self._binding[0])
+            self._binding[:] = [None, None]
+        super().close()
+
+
+class FigureCompositeClip(me.CompositeVideoClip):
+    '''
+    合成时归还不在播放的 `FigureClip` 的figure
+
+    按时间顺序写出视频时，段落结束后其figure即可交给之后的段落使用，
+    同时存在的figure数只取决于同时播放的段落数
+    '''
+
+    def frame_function(self, t: float) -> np.ndarray:
+        for clip in self.clips:
+            if isinstance(clip, FigureClip) and not clip.is_playing(t):
+                clip.close()
+        return super().frame_function(t)
+    # endregion
+
+
+# region ArtistBlitter
+class ArtistBlitter():
+    '''
+    matplotlib的局部重绘（blitting）
+
+    初始化时完整绘制一次figure（动态图元不参与），并用 `copy_from_bbox` 保存背景；
+    之后每帧只恢复背景并单独绘制动态图元，不再重新绘制整个figure。
+    动态图元位于最上层时，结果与每帧调用 `fig.canvas.draw()` 逐像素一致
+
+    !Warning `draw` 返回的是画布缓冲区本身（不复制），内容在下一次 `draw` 时被覆盖
+    '''
+
+    def __init__(self, fig: Figure, artists: list[Artist]) -> None:
+        '''
+        Parameters
+        ---
+        fig:
+            - 要绘制的figure，不是Agg画布时（例如已从pyplot中关闭）会换上Agg画布
+        artists:
+            - 逐帧变化的图元，按绘制顺序排列
+        '''
+        self.fig = fig
+        if not isinstance(fig.canvas, FigureCanvasAgg):
+            FigureCanvasAgg(fig)
+        self.canvas = fig.canvas
+        self.artists = list(artists)
+        for artist in self.artists:
+            artist.set_animated(True)
+        self.background = None
+        self.capture()
+
+    def capture(self):
+        '''
+        重新绘制并保存背景，静态内容有变化时需调用
+        '''
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def draw(self) -> np.ndarray:
+        '''
+        恢复背景并绘制动态图元
+
+        Return
+        ---
+        rgba shape[h,w,4]，画布缓冲区的视图
+        '''
+        self.canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+        return np.asarray(self.canvas.buffer_rgba())
+
+
+def timeline_frame_function(
+        fig: Figure,
+        art_timeline: Artist,
+        time2bar,
+        ylim: tuple[float, float],
+    ):
+    '''
+    用局部重绘生成钢琴卷帘时间线的逐帧函数
+
+    Parameters
+    ---
+    art_timeline:
+        - 时间线（`Line2D`）
+    time2bar:
+        - 片段内时间（秒） -> 时间线所在的横坐标
+    ylim:
+        - 时间线的纵向范围
+
+    Return
+    ---
+    frame_function(t) -> rgb shape[h,w,3]，画布缓冲区的视图
+    '''
+    blitter = ArtistBlitter(fig, [art_timeline])
+
+    def frame_function(t: float) -> np.ndarray:
+        x = time2bar(t)
+        art_timeline.set_data([x, x], ylim)
+        return blitter.draw()[:, :, :3]
+
+    frame_function.blitter = blitter
+    return frame_function
+    # endregion
+
+
 # region MidiVisualizer
 class MidiVisualizer():
     '''
@@ -610,6 +901,7 @@ class MidiVisualizer():
             **kwds
         ) -> None:
         self.mtracks: dict[str, np.ndarray] = {}
+        self._indexes: dict[str, NoteIndex] = {}
         self.spb = 4  # steps per beat
         self.bpB = 4  # beats per Bar
         self.bpM = 120  # beats per Minutes
@@ -621,6 +913,7 @@ class MidiVisualizer():
         self.pitch_clip_range: list[float] = [33, 93]  # [A2,A7]
         self.expand_range: list[float] = [4, 4]
         self.min_pitch_range: list[float] = [10, 10]
+        self.timeline_blit = True  # 时间线用局部重绘，画面与完整重绘一致
         ## 从脚本文件中覆写参数
         if None is midifile:
             midifile = mido.MidiFile(midi_fp)
@@ -643,6 +936,11 @@ class MidiVisualizer():
             self.ax_fg,
             self.art_timeline,
             ) = MidiVisualizer._init_figure(self.h / 1080)
+        # 各Midi片段使用的figure
+        self.figure_pool_A = FigurePool(
+            lambda: MidiVisualizer._init_figure(self.h / 1080)
+            )
+        self.figure_pool_B = FigurePool(MidiVisualizer._init_figure_B)
 
     def _parse_midifile(self, mid: mido.MidiFile):
         for trk in mid.tracks:
@@ -707,12 +1005,12 @@ class MidiVisualizer():
         scale:
             - 缩放系数，相对于2160x1080而言
         '''
-        plt.close()
-        fig = plt.figure(
+        fig = Figure(
             figsize=(6.4, 1.8),
             dpi=600 * 0.47 * scale,
             facecolor=MidiVisualizer.COLOR_BG,
             )
+        FigureCanvasAgg(fig)
         ax_bg: plt.Axes = fig.add_axes([0, 0.1, 1, 0.9])
         ax_mask: plt.Axes = fig.add_axes([0, 0, 1, 0.1])
         ax_fg: plt.Axes = fig.add_axes([0.05, 0.1, 0.95, 0.9])
@@ -799,6 +1097,22 @@ class MidiVisualizer():
             )
         return fig, ax_bg, ax_fg, art_timeline
 
+    @staticmethod
+    def _init_figure_B():
+        '''
+        只有时间线的透明画布
+        '''
+        fig = Figure(
+            figsize=(6.4, 1.8),
+            dpi=600 * 0.47,
+            facecolor=(1, 1, 1, 0),
+            )
+        FigureCanvasAgg(fig)
+        ax_fg: plt.Axes = fig.add_axes([0.05, 0.1, 0.95, 0.9])
+        ax_fg.set_ylim([0, 1])
+        ax_fg.axis('off')
+        return fig, ax_fg
+
     def sub(
             self,
             range: list[float],
@@ -829,12 +1143,10 @@ class MidiVisualizer():
         else:
             chn = channels
         for k in chn.keys():
-            mtrack = self.mtracks[k]
-            sub_mtracks[k] = mtrack[np.where((mtrack[:, 3] > start)
-                                                & (mtrack[:, 2] < end)
-                                                & (mtrack[:, 0] > low)
-                                                & (mtrack[:, 0] < high))]
+            if k not in self._indexes:
+                self._indexes[k] = NoteIndex(self.mtracks[k])
             # 音符的终点在范围起点后，音符的起点在范围终点前
+            sub_mtracks[k] = self._indexes[k].query(start, end, low, high)
         return sub_mtracks
 
     def timeBar2Trk(self, tBar: float):
@@ -927,8 +1239,7 @@ class MidiVisualizer():
         rgba shape[h,w,4]
         '''
         # 初始化
-        self.ax_fg._children = []
-        self.ax_fg.containers = []
+        remove_artists(self.ax_fg)
         self.ax_fg._current_image = None
         # self.ax_fg.clear()
         # self.ax_fg.get_legend().remove()
@@ -1004,10 +1315,7 @@ class MidiVisualizer():
         rgba shape[h,w,4]
         '''
         # 初始化
-        ax_fg._children = []
-        ax_fg.containers = []
-        # ax_fg.get_legend().remove()
-        ax_fg.legend_ = None
+        remove_artists(ax_fg)
         ylim = MidiVisualizer.get_disp_pitch_range(
             midipattern.pitch_range,
             self.expand_range,
@@ -1060,28 +1368,39 @@ class MidiVisualizer():
         # fig.canvas.draw()
 
     def get_video_clip_sytle_A(self, midipattern: MidiPattern):
-        plt.close()
-        fig, ax_bg, ax_fg, art_timeline = MidiVisualizer._init_figure(
-            self.h / 1080
-            )
-        self.make_fig(midipattern, fig, ax_bg, ax_fg)
         xlim = midipattern.disp_range
-        art_timeline, *_ = ax_fg.plot(
-            [],
-            [],
-            color=MidiVisualizer.COLOR_TIME_LINE,
-            zorder=3,
-            )
 
-        def makeFrame(t: float):
-            t_bar = (t/60) * self.BpM + xlim[0]
-            art_timeline.set_data([t_bar, t_bar], [0, 102])
-            fig.canvas.draw()
-            frame = np.array(fig.canvas.buffer_rgba())
-            return frame[:, :, :3]
+        def setup(figure: tuple):
+            fig, ax_bg, ax_fg, art_timeline = figure
+            self.make_fig(midipattern, fig, ax_bg, ax_fg)
+            art_timeline, *_ = ax_fg.plot(
+                [],
+                [],
+                color=MidiVisualizer.COLOR_TIME_LINE,
+                zorder=3,
+                )
+
+            if self.timeline_blit:
+                return timeline_frame_function(
+                    fig,
+                    art_timeline,
+                    lambda t: (t/60) * self.BpM + xlim[0],
+                    [0, 102],
+                    )
+
+            def makeFrame(t: float):
+                t_bar = (t/60) * self.BpM + xlim[0]
+                art_timeline.set_data([t_bar, t_bar], [0, 102])
+                fig.canvas.draw()
+                frame = np.array(fig.canvas.buffer_rgba())
+                return frame[:, :, :3]
 
-        vc = me.VideoClip(
-            makeFrame, duration=self.spanBar2True(xlim[1] - xlim[0])
+            return makeFrame
+
+        vc = FigureClip(
+            setup,
+            self.figure_pool_A,
+            duration=self.spanBar2True(xlim[1] - xlim[0]),
             )
         return vc
 
@@ -1109,35 +1428,38 @@ class MidiVisualizer():
     #     return vc
 
     def get_video_clip_sytle_B(self, midipattern: MidiPattern):
-        plt.close()
-        # fig, ax_bg, ax_fg = MidiVisualizer._init_figure(self.h / 1080)
-        fig = plt.figure(
-            figsize=(6.4, 1.8),
-            dpi=600 * 0.47,
-            facecolor=(1, 1, 1, 0),
-            )
-        ax_fg: plt.Axes = fig.add_axes([0.05, 0.1, 0.95, 0.9])
-        # self.make_fig(midipattern, fig, ax_bg, ax_fg)
         xlim = midipattern.disp_range
-        ax_fg.set_ylim([0, 1])
-        ax_fg.set_xlim(xlim)
-        ax_fg.axis('off')
-        art_timeline, *_ = ax_fg.plot(
-            [],
-            [],
-            color=MidiVisualizer.COLOR_TIME_LINE,
-            zorder=3,
-            )
 
-        def makeFrame(t: float):
-            t_bar = (t/60) * self.BpM + xlim[0]
-            art_timeline.set_data([t_bar, t_bar], [0, 1])
-            fig.canvas.draw()
-            frame = np.array(fig.canvas.buffer_rgba())
-            return frame[:, :, :3]
+        def setup(figure: tuple):
+            fig, ax_fg = figure
+            ax_fg.set_xlim(xlim)
+            art_timeline, *_ = ax_fg.plot(
+                [],
+                [],
+                color=MidiVisualizer.COLOR_TIME_LINE,
+                zorder=3,
+                )
+
+            if self.timeline_blit:
+                return timeline_frame_function(
+                    fig,
+                    art_timeline,
+                    lambda t: (t/60) * self.BpM + xlim[0],
+                    [0, 1],
+                    )
+
+            def makeFrame(t: float):
+                t_bar = (t/60) * self.BpM + xlim[0]
+                art_timeline.set_data([t_bar, t_bar], [0, 1])
+                fig.canvas.draw()
+                frame = np.array(fig.canvas.buffer_rgba())
+                return frame[:, :, :3]
+
+            return makeFrame
 
-        vc = me.VideoClip(
-            makeFrame,
+        vc = FigureClip(
+            setup,
+            self.figure_pool_B,
             duration=self.spanBar2True(xlim[1] - xlim[0]),
             )
         return vc
@@ -1163,7 +1485,7 @@ if __name__ == '__main__':
     mov.make_section_CountDown()
     mov.make_section_Para(script.paragraphs)
     mov.make_section_Midi(script.midi_patterns)
-    comp_vc = me.CompositeVideoClip(mov.arr_clip, size=(mov.w, mov.h))
+    comp_vc = FigureCompositeClip(mov.arr_clip, size=(mov.w, mov.h))
     if None is not script.session_data['subclip_tBar']:
         subclip_tBar = script.session_data['subclip_tBar']
         comp_vc = comp_vc.subclip(
@@ -0,0 +1,62 @@
+'''
+layer_mix（浮点） 与 LayerBlender（定点、就地） 的对比测试
+
+>>> python benchmarks/bench_layer_mix.py
+'''
+import sys
+from pathlib import Path
+from timeit import repeat
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+from midiscript_videoifier.utils import layer_mix, LayerBlender
+
+
+def bench(fn, number=20):
+    return min(repeat(fn, number=number, repeat=5)) / number * 1000
+
+
+def main(h=1080, w=2160):
+    rng = np.random.default_rng(0)
+    frame_rgb = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    frame_rgba = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+    # 典型的文本图层尺寸
+    fg_rgb = rng.integers(0, 256, (h // 2, w // 2, 3), dtype=np.uint8)
+    fg_rgba = rng.integers(0, 256, (h // 2, w // 2, 4), dtype=np.uint8)
+    sl = np.s_[h // 4:h // 4 + h // 2, w // 4:w // 4 + w // 2]
+    blender = LayerBlender()
+
+    cases = {
+        'opaque        ': (frame_rgb, fg_rgb),
+        'RGBA over RGB ': (frame_rgb, fg_rgba),
+        'RGBA over RGBA': (frame_rgba, fg_rgba),
+        }
+    print(f'frame {w}x{h}, layer {w//2}x{h//2}')
+    print(f'{"case":14}  {"layer_mix":>10}  {"blender":>10}  speedup  max|diff|')
+    for name, (frame, fg) in cases.items():
+        dst = frame.copy()
+
+        def old():
+            dst[sl] = layer_mix(dst[sl], fg)
+
+        def new():
+            blender.blend(dst[sl], fg)
+
+        with np.errstate(all='ignore'):
+            # 旧实现在完全透明处会除零
+            t_old = bench(old)
+            ref = layer_mix(frame[sl], fg).astype(np.int16)
+        t_new = bench(new)
+        out = blender.blend(frame[sl].copy(), fg).astype(np.int16)
+        diff = np.abs(ref - out)
+        if frame.shape[2] == 4:
+            # 完全透明处的颜色无意义
+            diff = diff[frame[sl][..., 3] | fg[..., 3] > 0]
+        print(
+            f'{name}  {t_old:8.2f}ms  {t_new:8.2f}ms  {t_old/t_new:6.1f}x'
+            f'  {diff.max()}'
+            )
+
+
+if __name__ == '__main__':
+    main()
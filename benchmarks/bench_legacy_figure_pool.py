@@ -0,0 +1,93 @@
+'''
+旧版 `MidiVideoifier.py` 中figure池的复用测试：
+按时间顺序合成时，段落结束后归还的figure被之后的段落复用，
+且复用的figure与新建的figure画面逐像素一致
+
+>>> python benchmarks/bench_legacy_figure_pool.py
+'''
+from pathlib import Path
+from importlib.util import spec_from_file_location, module_from_spec
+from time import perf_counter
+import mido
+import numpy as np
+
+# 旧版脚本不依赖包，按文件路径加载
+_spec = spec_from_file_location(
+    'MidiVideoifier',
+    Path(__file__).parents[1] / 'MidiVideoifier.py',
+    )
+MV = module_from_spec(_spec)
+_spec.loader.exec_module(MV)
+
+
+def make_midifile(n_bars=12, tpb=96, seed=0) -> mido.MidiFile:
+    '''
+    两条轨道、每拍一个随机音符的Midi文件
+    '''
+    rng = np.random.default_rng(seed)
+    mid = mido.MidiFile(ticks_per_beat=tpb)
+    for name, low in [('Lead', 60), ('Chord', 48)]:
+        track = mido.MidiTrack()
+        track.append(mido.MetaMessage('track_name', name=name))
+        for note in rng.integers(low, low + 12, n_bars * 4):
+            track.append(mido.Message('note_on', note=note, velocity=100))
+            track.append(mido.Message('note_off', note=note, time=tpb))
+        mid.tracks.append(track)
+    return mid
+
+
+def make_patterns(ranges, channels) -> list:
+    patterns = []
+    for r in ranges:
+        mp = MV.MidiPattern(r, channels)
+        mp.disp_range = r
+        patterns.append(mp)
+    return patterns
+
+
+def main(h=540, fps=10):
+    mv = MV.MidiVisualizer(make_midifile(), h=h)
+    channels = {'Lead': 'Lead', 'Chord': 'Chord'}
+    # 前两段有重叠，之后的段落依次衔接
+    patterns = make_patterns(
+        [[1, 3], [2, 4], [4, 6], [6, 8], [8, 10], [10, 12]], channels
+        )
+    for mp in patterns:
+        mv.put_midi_data(mp)
+    for style in 'AB':
+        get_clip = getattr(mv, f'get_video_clip_sytle_{style}')
+        pool = getattr(mv, f'figure_pool_{style}')
+        clips = [
+            get_clip(mp).with_start(mv.timeBar2Mov(mp.disp_range[0]))
+            for mp in patterns
+            ]
+        comp = MV.FigureCompositeClip(clips, size=clips[0].size)
+        # 参照：每个段落使用新建的figure
+        refs = []
+        for mp in patterns:
+            setattr(mv, f'figure_pool_{style}', MV.FigurePool(pool.factory))
+            refs.append(get_clip(mp))
+        setattr(mv, f'figure_pool_{style}', pool)
+
+        n_frames = int(comp.duration * fps)
+        t0 = perf_counter()
+        for i in range(n_frames):
+            t = i / fps
+            frame = comp.get_frame(t)
+            # 片段位置相同且不透明，画面即最上层的片段
+            playing = [(c, r) for c, r in zip(clips, refs) if c.is_playing(t)]
+            if playing:
+                clip, ref = playing[-1]
+                expected = ref.get_frame(t - clip.start)
+                assert np.array_equal(frame, expected), (style, t)
+        elapsed = perf_counter() - t0
+        print(
+            f'style {style}: {len(patterns)} patterns, '
+            f'{pool.n_figures} figures built, {n_frames} frames '
+            f'(identical to fresh figures), {elapsed:.2f}s incl. reference'
+            )
+        assert pool.n_figures == 2, pool.n_figures
+
+
+if __name__ == '__main__':
+    main()
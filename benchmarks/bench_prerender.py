@@ -0,0 +1,70 @@
+'''
+Midi底图预绘制：逐个绘制、进程池 与 线程池 的对比测试
+
+>>> python benchmarks/bench_prerender.py
+'''
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+from midiscript_videoifier.base.components import MidiPattern
+from midiscript_videoifier.base.pianoroll import PianoRollRenderer
+from midiscript_videoifier.base.prerender import prerender_patterns
+
+
+def make_patterns(n_patterns=8, n_notes=150, seed=0) -> list[MidiPattern]:
+    '''
+    生成已填充音符的Midi段落，每段两小节、三条轨道
+    '''
+    rng = np.random.default_rng(seed)
+    patterns = []
+    for k in range(n_patterns):
+        x0 = 1 + 2*k
+        channels = {f'trk {i}': f'trk {i}' for i in range(3)}
+        mp = MidiPattern([x0, x0 + 2], channels)
+        mp.disp_range = mp.range
+        mp.mtracks = {}
+        for name in mp.channels:
+            start = rng.uniform(x0, x0 + 2, n_notes).astype(np.float32)
+            length = rng.uniform(1 / 16, 1 / 4, n_notes).astype(np.float32)
+            pitch = rng.integers(48, 72, n_notes).astype(np.float32)
+            velocity = np.full(n_notes, 100, dtype=np.float32)
+            mp.mtracks[name] = np.stack(
+                [pitch, velocity, start, start + length, length], axis=1
+                )
+        mp.pitch_range = [48, 71]
+        patterns.append(mp)
+    return patterns
+
+
+def main(workers=None):
+    workers = workers or os.cpu_count()
+    patterns = make_patterns()
+    renderer = PianoRollRenderer(scale=0.5)
+    results, times = {}, {}
+    for name, kwds in {
+            'sequential': dict(workers=1),
+            'process': dict(workers=workers, executor='process'),
+            'thread': dict(workers=workers, executor='thread'),
+        }.items():
+        with TemporaryDirectory() as tmp_dir:
+            t0 = perf_counter()
+            rasters = prerender_patterns(renderer, patterns, tmp_dir, **kwds)
+            times[name] = perf_counter() - t0
+            results[name] = [np.array(raster) for raster, _ in rasters]
+    for name in ['process', 'thread']:
+        assert all(
+            np.array_equal(a, b)
+            for a, b in zip(results['sequential'], results[name])
+            ), name
+    print(f'{len(patterns)} MidiPatterns, {workers} workers (results identical)')
+    for name, t in times.items():
+        print(f'  {name:10}: {t:6.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+'''
+管道传输 RGB24 与 NumPy 预转换 YUV420p 的对比测试，
+并与ffmpeg自身的 BT.709 转换（有限范围与全范围）比较色彩精度
+
+>>> python benchmarks/bench_yuv420p.py
+'''
+import sys
+import subprocess
+from pathlib import Path
+from time import perf_counter
+from timeit import repeat
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+from midiscript_videoifier.output.yuv import YUV420Converter
+from midiscript_videoifier.output.writer import FFmpegPipeWriter
+
+
+def test_image(h, w):
+    '''
+    渐变、纯色块与噪声行混合的测试画面
+    '''
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:h, 0:w]
+    img = np.stack([xx * 255 / w, yy * 255 / h, (xx+yy) % 256], axis=-1)
+    img = img.astype(np.uint8)
+    img[::7] = rng.integers(0, 256, (len(img[::7]), w, 3), dtype=np.uint8)
+    img[:h // 4, :w // 4] = [49, 56, 62]  # 背景色
+    # 饱和的纯红、纯蓝块：全范围下V、U达到上限255
+    img[h // 4:h // 2, :w // 4] = [255, 0, 0]
+    img[h // 2:3 * h // 4, :w // 4] = [0, 0, 255]
+    return img
+
+
+def ffmpeg_yuv420p(img: np.ndarray, full_range: bool = False) -> np.ndarray:
+    '''
+    由ffmpeg转换的 BT.709 I420（色度为2x2均值，与 `YUV420Converter` 的采样一致）
+    '''
+    h, w = img.shape[:2]
+    out_range = 'pc' if full_range else 'tv'
+    cmd = [
+        FFMPEG_BINARY, '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+        '-s', f'{w}x{h}', '-i', '-', '-vf',
+        f'scale=out_color_matrix=bt709:out_range={out_range}'
+        ':flags=area+accurate_rnd',
+        '-pix_fmt', 'yuv420p', '-f', 'rawvideo', '-'
+        ]
+    out = subprocess.run(cmd, input=img.tobytes(), capture_output=True).stdout
+    return np.frombuffer(out, dtype=np.uint8)
+
+
+def check_accuracy(img: np.ndarray, converter: YUV420Converter):
+    ours = converter.convert(img)
+    ref = ffmpeg_yuv420p(img, converter.full_range)
+    out_range = 'pc' if converter.full_range else 'tv'
+    print(f'accuracy vs ffmpeg (bt709/{out_range}, area+accurate_rnd):')
+    for name, a, b in zip('YUV', converter.planes(ours), converter.planes(ref)):
+        diff = np.abs(a.astype(np.int16) - b)
+        print(f'  {name}: max|diff| {diff.max()}  mean {diff.mean():.4f}')
+        assert diff.max() <= 1, f'{name} 平面与ffmpeg的差异超过1'
+
+
+def bench_pipe(img, pipe_pix_fmt, n_frames=120, fps=60):
+    '''
+    写入 `-f null` 的端到端速度（取帧之外的全部开销：转换、管道与编码）
+    '''
+    h, w = img.shape[:2]
+    t0 = perf_counter()
+    with FFmpegPipeWriter(
+            '-',
+            (w, h),
+            fps,
+            codec='libx264',
+            preset='ultrafast',
+            pipe_pix_fmt=pipe_pix_fmt,
+            ffmpeg_params=['-f', 'null'],
+            report_interval=0,
+        ) as writer:
+        for _ in range(n_frames):
+            writer.write_frame(img)
+    return n_frames / (perf_counter() - t0)
+
+
+def main(h=1080, w=2160):
+    img = test_image(h, w)
+    converter = YUV420Converter((w, h))
+    out = converter.new_buffer()
+    check_accuracy(img, converter)
+    check_accuracy(img, YUV420Converter((w, h), full_range=True))
+    t = min(repeat(lambda: converter.convert(img, out), number=10, repeat=3))
+    print(f'frame {w}x{h}')
+    print(f'  NumPy RGB24 -> YUV420p: {t / 10 * 1000:.2f}ms/frame')
+    print(
+        f'  bytes per frame: rgb24 {img.nbytes / 2**20:.2f}MB, '
+        f'yuv420p {out.nbytes / 2**20:.2f}MB'
+        )
+    for pipe_pix_fmt in ['rgb24', 'yuv420p']:
+        print(
+            f'  pipe {pipe_pix_fmt:8} -> libx264 ultrafast: '
+            f'{bench_pipe(img, pipe_pix_fmt):.1f} fps'
+            )
+
+
+if __name__ == '__main__':
+    main()
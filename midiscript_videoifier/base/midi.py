@@ -0,0 +1,326 @@
+import mido
+import numpy as np
+from pathlib import Path
+from typing import Union
+from .components import MidiPattern
+from .smf import read_smf, read_ticks_per_beat, pair_notes, NOTE_EVENT_DTYPE
+from .tempo import TempoMap
+from ..utils import DiskCache, make_key, file_digest
+from ..utils.noteindex import NoteIndex
+
+from ..configs.default import CONFIG
+
+
+class MidiNotes():
+    '''
+    从Midi文件中读取的音符表
+
+    每条轨道为形如 [n,5] 的数组，各列依次为
+    音高, 力度, 开始时间, 结束时间, 持续长度
+    其中时间的单位为小节时间 `tBar` （已加上 InitBar 以匹配手稿时间）
+    tick到小节时间的换算按文件中的拍号分段进行，见 `tempo_map`
+
+    从文件读取时可以使用磁盘缓存：所有轨道拼接为一张 float32 的表，
+    命中时以内存映射方式读取，各轨道是其中的只读切片，多个进程共享同一份页面
+    '''
+    VERSION = 3  # 解析方式有变化时递增
+
+    def __init__(
+            self,
+            midifile: mido.MidiFile = None,
+            midi_fp: Union[str, Path] = None,
+            spb: int = None,
+            bpB: int = None,
+            InitBar: int = None,
+            bpM: float = None,
+            BeginTime: float = None,
+            pitch_clip_range: list[float] = None,
+            expand_range: list[float] = None,
+            min_pitch_range: list[float] = None,
+            cache: DiskCache = None,
+            **kwds
+        ) -> None:
+        self.mtracks: dict[str, np.ndarray] = {}
+        self._indexes: dict[str, NoteIndex] = {}
+        self.spb = spb or CONFIG.spb
+        self.bpB = bpB or CONFIG.bpB
+        self.InitBar = InitBar or CONFIG.InitBar
+        self.bpM = bpM or CONFIG.bpM
+        self.BeginTime = CONFIG.BeginTime if None is BeginTime else BeginTime
+        self.pitch_clip_range = pitch_clip_range or CONFIG.pitch_clip_range
+        self.expand_range = expand_range or CONFIG.expand_range
+        self.min_pitch_range = min_pitch_range or CONFIG.min_pitch_range
+        ## 计算二级参数并处理Midi轨道
+        if None is not midifile:
+            self.tpb = midifile.ticks_per_beat
+        else:
+            self.tpb = read_ticks_per_beat(midi_fp)
+        self.step = self.tpb // 4  # Fl studio中可视的最小单位长度 24
+        self.beat = self.step * self.spb
+        self.Bar = self.beat * self.bpB
+        if None is not midifile:
+            self.set_tempo_map(*midifile_timing(midifile))
+            self._parse_midifile(midifile)
+        elif None is cache:
+            self._parse_smf(midi_fp)
+        else:
+            key = self.cache_key(midi_fp)
+            hit = self._load_cache(cache, key)
+            if not hit:
+                self._parse_smf(midi_fp)
+                self._save_cache(cache, key)
+            print(f'midi cache: {"hit" if hit else "miss"} ({cache.root})')
+
+    def set_tempo_map(
+            self,
+            tempos: np.ndarray,
+            time_signatures: np.ndarray
+        ):
+        '''
+        由文件中的速度与拍号事件建立 `tempo_map`
+        '''
+        self.tempos = np.asarray(tempos, dtype=np.int64).reshape(-1, 2)
+        self.time_signatures = np.asarray(
+            time_signatures, dtype=np.int64
+            ).reshape(-1, 3)
+        self.tempo_map = TempoMap(
+            self.tpb,
+            self.tempos,
+            self.time_signatures,
+            bpM=self.bpM,
+            spb=self.spb,
+            bpB=self.bpB,
+            InitBar=self.InitBar,
+            BeginTime=self.BeginTime,
+            )
+
+    def cache_key(self, midi_fp: Union[str, Path]) -> str:
+        '''
+        解析结果的缓存键：文件内容与换算小节时间所用的参数
+        '''
+        return make_key(
+            type(self).__name__,
+            self.VERSION,
+            file_digest(midi_fp),
+            self.tpb,
+            self.spb,
+            self.bpB,
+            self.InitBar,
+            )
+
+    def _load_cache(self, cache: DiskCache, key: str) -> bool:
+        index = cache.load(f'{key}-index', mmap_mode=None)
+        table = cache.load(key) if None is not index else None
+        tempos = cache.load(f'{key}-tempos', mmap_mode=None)
+        signatures = cache.load(f'{key}-signatures', mmap_mode=None)
+        if None is table or None is tempos or None is signatures:
+            return False
+        self.set_tempo_map(tempos, signatures)
+        self.mtracks = {
+            str(name): table[start:stop]
+            for name, start, stop in index.tolist()
+            }
+        return True
+
+    def _save_cache(self, cache: DiskCache, key: str):
+        names = list(self.mtracks)
+        lengths = np.array([len(v) for v in self.mtracks.values()], dtype=int)
+        stops = np.cumsum(lengths)
+        index = np.empty(
+            len(names),
+            dtype=[
+                ('name', f'U{max(map(len, names), default=1)}'),
+                ('start', np.int64),
+                ('stop', np.int64),
+                ]
+            )
+        index['name'] = names
+        index['start'] = stops - lengths
+        index['stop'] = stops
+        table = np.concatenate(
+            list(self.mtracks.values())
+            ) if names else np.empty((0, 5), dtype=np.float32)
+        # 先写音符表再写索引，读取时以索引存在为准
+        cache.save(f'{key}-tempos', self.tempos)
+        cache.save(f'{key}-signatures', self.time_signatures)
+        cache.save(key, table)
+        cache.save(f'{key}-index', index)
+
+    def _parse_smf(self, midi_fp: Union[str, Path]):
+        '''
+        用 `read_smf` 读取音符、速度与拍号事件，结果与 `_parse_midifile` 一致
+        （同音高重叠的音符按先开始先结束配对，力度为0的 note_on 视为音符结束）
+        '''
+        _, tracks, tempos, time_signatures = read_smf(midi_fp)
+        self.set_tempo_map(tempos, time_signatures)
+        for name, events in tracks:
+            if None is name:
+                continue
+            mtrack = pair_notes(events)
+            if len(mtrack) > 0:
+                self.mtracks[name] = self.to_bar_time(mtrack)
+
+    def _parse_midifile(self, mid: mido.MidiFile):
+        for trk in mid.tracks:
+            trk: mido.MidiTrack
+            msg: mido.MetaMessage = trk[0]
+            if 'track_name' == msg.type:
+                mtrack = self.process_miditrack(trk)
+                if mtrack is not None:  # 非None
+                    self.mtracks[msg.name] = mtrack
+
+    def process_miditrack(self, track: mido.MidiTrack):
+        '''
+        !Warning 手稿的时间戳按照FL的小节记数，即1,2,...
+        因此在处理Midi事件的时间标记时，会统一 + InitBar 来匹配小节时间
+        '''
+        mtrack = pair_notes(miditrack_events(track))
+        if len(mtrack) > 0:
+            return self.to_bar_time(mtrack)
+        else:
+            return None
+
+    def to_bar_time(self, mtrack: Union[list, np.ndarray]) -> np.ndarray:
+        '''
+        将以tick为单位的音符表转换为小节时间
+        开始和结束时间按拍号分段换算（已 + InitBar 以匹配手稿时间），
+        持续长度为两者之差
+        '''
+        mtrack = np.array(mtrack, dtype=np.float64)
+        mtrack[:, 2:4] = self.tempo_map.tick2bar(mtrack[:, 2:4])
+        mtrack[:, 4] = mtrack[:, 3] - mtrack[:, 2]
+        return mtrack.astype(np.float32)
+
+    def sub(
+            self,
+            range: list[float],
+            channels: dict[str, str],
+            pitch_clip_range: list[float] = None
+        ):
+        '''
+        从完整的Midi中按起始位置裁剪片段
+
+        Parameters
+        ---
+        range:
+            - 选择的Bar时间范围
+        channels:
+            - 选择的轨道，支持 `all` 关键字
+        pitch_clip_range:
+            - 音符音高最大范围。默认采用全局的统一值
+        '''
+        sub_mtracks: dict[str, np.ndarray] = {}
+        start, end = range
+        low, high = self.pitch_clip_range if (
+            pitch_clip_range is None
+            ) else pitch_clip_range
+        if 'all' in channels:
+            chn = {k: k for k in self.mtracks.keys()}
+            chn.update(channels)
+            chn.pop('all')
+        else:
+            chn = channels
+        for k in chn.keys():
+            # 音符的终点在范围起点后，音符的起点在范围终点前
+            sub_mtracks[k] = self.note_index(k).query(start, end, low, high)
+        return sub_mtracks
+
+    def note_index(self, channel: str) -> NoteIndex:
+        '''
+        轨道的区间查询索引，首次使用时建立
+        '''
+        if channel not in self._indexes:
+            self._indexes[channel] = NoteIndex(self.mtracks[channel])
+        return self._indexes[channel]
+
+    def put_midi_data(self, midipattern: MidiPattern):
+        '''
+        给一个midipattern添加其指定范围的midi数据
+        '''
+        midipattern.mtracks = self.sub(
+            midipattern.range,
+            midipattern.channels,
+            midipattern.pitch_clip_range
+            )
+        key_min, key_max = None, None
+        for mtrack in midipattern.mtracks.values():
+            if len(mtrack) == 0:
+                continue
+            min, max = mtrack[:, 0].min(), mtrack[:, 0].max()
+            if key_min is None or min < key_min:
+                key_min = min
+            if key_max is None or max > key_max:
+                key_max = max
+        if key_min is None:  # 该范围内没有音符，以C4为中心显示
+            key_min, key_max = 60, 60
+        midipattern.pitch_range = [key_min, key_max]
+
+    @staticmethod
+    def get_disp_pitch_range(
+            pitch_range: list[float],
+            expand_range: list[float] = [4, 4],
+            min_pitch_range: list[float] = [10, 10]
+        ):
+        '''
+        用于获取显示的音符范围
+
+        Parameters
+        ---
+        pitch_range:
+            - 原始的音高范围
+        expand_range:
+            - 下上边界各自需要拓宽的范围
+        min_pitch_range:
+            - 最小的音高范围，分下半和上半
+        '''
+        p_range = [
+            min([
+                pitch_range[0] - expand_range[0],
+                round(np.mean(pitch_range)) - min_pitch_range[0]
+                ]),
+            max([
+                pitch_range[1] + expand_range[1],
+                round(np.mean(pitch_range)) + min_pitch_range[1]
+                ])
+            ]
+        return p_range
+
+
+def miditrack_events(track: mido.MidiTrack) -> np.ndarray:
+    '''
+    将 `mido.MidiTrack` 中的音符消息整理为 `NOTE_EVENT_DTYPE` 的音符事件，
+    约定与 `scan_track` 一致，配对交给同一个 `pair_notes`
+    '''
+    events = []
+    t = 0  # tick time
+    for msg in track:
+        t += msg.time
+        if 'note_on' == msg.type or 'note_off' == msg.type:
+            events.append((
+                t,
+                msg.note,
+                msg.velocity,
+                'note_on' == msg.type and msg.velocity > 0,
+                ))
+    return np.array(events, dtype=NOTE_EVENT_DTYPE)
+
+
+def midifile_timing(mid: mido.MidiFile) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    收集 `mido.MidiFile` 各轨道中的速度与拍号事件，格式与 `read_smf` 一致
+    '''
+    tempos, time_signatures = [], []
+    for trk in mid.tracks:
+        t = 0
+        for msg in trk:
+            t += msg.time
+            if 'set_tempo' == msg.type:
+                tempos.append((t, msg.tempo))
+            elif 'time_signature' == msg.type:
+                time_signatures.append((t, msg.numerator, msg.denominator))
+    tempos.sort(key=lambda e: e[0])
+    time_signatures.sort(key=lambda e: e[0])
+    return (
+        np.array(tempos, dtype=np.int64).reshape(-1, 2),
+        np.array(time_signatures, dtype=np.int64).reshape(-1, 3),
+        )
@@ -2,14 +2,38 @@ import numpy as np
 import moviepy as me
 import melody_machine as mm
 from .components import Paragraph, MidiPattern
+from .script import Script
+from .timeline import (
+    ClipTimeline,
+    FrameSchedule,
+    is_static_clip,
+    has_fixed_position,
+    mark_fixed_position,
+    mark_static,
+    )
+from .midi import MidiNotes
+from .tempo import TempoMap
+from .pianoroll import PianoRollRenderer, PlayheadClip
+from .rasterizer import NumpyPianoRollRenderer
+from .prerender import prerender_patterns
+from .text import TextRasterCache, TextRasterClip, premultiply
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import Union, Literal
 from moviepy.Clip import Clip
 from moviepy import VideoClip, CompositeAudioClip
 from moviepy.tools import compute_position
-from ..utils import layer_mix
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from ..utils import LayerBlender, DiskCache, DEFAULT_CACHE_DIR
 
-from ..configs.default import CONFIG, COLOR
+from ..configs.default import CONFIG, COLOR, apply_plot_style
+
+
+def draft_size(h: int, w: int, scale: float) -> tuple[int, int]:
+    '''
+    草稿模式的画面尺寸 (h, w)，取偶数以满足 YUV420p 的要求
+    '''
+    return 2 * max(round(h * scale / 2), 1), 2 * max(round(w * scale / 2), 1)
 
 
 class Movie():
@@ -19,7 +43,7 @@ class Movie():
 
     def __init__(
             self,
-            song: mm.Song,
+            song: mm.Song = None,
             BeginTime: int = None,
             CountDown: int = None,
             InitBar: int = None,
@@ -36,15 +60,39 @@ class Movie():
             subclip_tBar: list[float] = None,
             subclip_tMov: list[float] = None,
             audio_fp: Union[str, Path] = None,
+            midi_fp: Union[str, Path] = None,
+            pitch_clip_range: list[float] = None,
+            expand_range: list[float] = None,
+            min_pitch_range: list[float] = None,
+            midi_render_mode: Literal['clip', 'raster', 'blit'] = None,
+            pianoroll_backend: Literal['matplotlib', 'numpy'] = None,
+            prerender_workers: int = None,
+            prerender_executor: Literal['process', 'thread'] = None,
+            cache_dir: Union[str, Path] = None,
+            raster_cache_size: float = None,
+            text_cache_size: float = None,
+            midi_cache_size: float = None,
+            draft: bool = None,
+            draft_scale: float = None,
             **kwds
         ) -> None:
         self.song = song
-        self.visualizer = song.visualizer
+        # 只计算时间安排（见 `script_duration`）时可以不提供Song
+        self.visualizer = None if None is song else song.visualizer
         self.arr_clip: list[Clip] = []
         self.h = h or CONFIG.h
         self.w = w or CONFIG.w
+        # 草稿模式：画面按 `draft_scale` 等比缩小，用于快速预览
+        self.draft = CONFIG.draft if None is draft else draft
+        self.draft_scale = draft_scale or CONFIG.draft_scale
+        if self.draft:
+            self.h, self.w = draft_size(self.h, self.w, self.draft_scale)
+        # 所有尺寸都以1080p为基准，字号等按画面高度等比缩放
+        self.scale = self.h / 1080
         self.bpB = bpB or CONFIG.bpB
-        self.BeginTime = BeginTime or CONFIG.BeginTime
+        self.BeginTime = CONFIG.BeginTime if None is BeginTime else BeginTime
+        self.bpM = bpM or CONFIG.bpM
+        self.tpb = tpb or CONFIG.tpb
         self.CountDown = CountDown or CONFIG.CountDown
         self.InitBar = InitBar or CONFIG.InitBar
         self.Title = Title or CONFIG.Title
@@ -53,42 +101,214 @@ class Movie():
         self.FontPath = FontPath or CONFIG.FontPath
         self.subclip_tBar = subclip_tBar or CONFIG.subclip_tBar
         self.subclip_tMov = subclip_tMov or CONFIG.subclip_tMov
+        self.spb = spb or CONFIG.spb
+        self.midi_fp = midi_fp
+        self.pitch_clip_range = pitch_clip_range or CONFIG.pitch_clip_range
+        self.expand_range = expand_range or CONFIG.expand_range
+        self.min_pitch_range = min_pitch_range or CONFIG.min_pitch_range
+        self.midi_render_mode = midi_render_mode or CONFIG.midi_render_mode
+        if 'clip' == self.midi_render_mode:
+            # melody_machine 仍通过pyplot绘制，依赖全局的绘图样式
+            apply_plot_style()
+        self.pianoroll_backend = pianoroll_backend or CONFIG.pianoroll_backend
+        self.prerender_workers = prerender_workers or CONFIG.prerender_workers
+        self.prerender_executor = (
+            prerender_executor or CONFIG.prerender_executor
+            )
+        self.cache_dir = Path(cache_dir or CONFIG.cache_dir or DEFAULT_CACHE_DIR)
+        self.raster_cache_size = CONFIG.raster_cache_size if (
+            None is raster_cache_size
+            ) else raster_cache_size
+        self.text_cache_size = CONFIG.text_cache_size if (
+            None is text_cache_size
+            ) else text_cache_size
+        self.midi_cache_size = CONFIG.midi_cache_size if (
+            None is midi_cache_size
+            ) else midi_cache_size
+        self.text_cache = TextRasterCache(
+            DiskCache(
+                self.cache_dir / 'texts',
+                max_bytes=int(self.text_cache_size * 2**20),
+                ) if self.text_cache_size else None
+            )
+        self._notes: MidiNotes = None
+        self._tempo_map: TempoMap = None
+        self._raster_dir: TemporaryDirectory = None
+        self.audio_fp = audio_fp
+        self.audio_duration = None
         if None is not audio_fp:
-            self.audio = me.AudioFileClip(audio_fp)
-        else:
-            self.audio = None
+            # 只读取时长，音频由ffmpeg在编码时直接混入，不在Python中解码
+            self.audio_duration = ffmpeg_parse_infos(str(audio_fp))['duration']
         for k, v in kwds.items():
             if k in self.__dict__:
                 self.__dict__[k] = v
 
+    @property
+    def notes(self) -> MidiNotes:
+        '''
+        直接从Midi文件读取的音符表，供 `raster` 渲染方式使用
+        '''
+        if None is self._notes:
+            self._notes = MidiNotes(
+                midi_fp=self.midi_fp,
+                spb=self.spb,
+                bpB=self.bpB,
+                InitBar=self.InitBar,
+                bpM=self.bpM,
+                BeginTime=self.BeginTime,
+                pitch_clip_range=self.pitch_clip_range,
+                expand_range=self.expand_range,
+                min_pitch_range=self.min_pitch_range,
+                cache=DiskCache(
+                    self.cache_dir / 'midi',
+                    max_bytes=int(self.midi_cache_size * 2**20),
+                    ) if self.midi_cache_size else None,
+                )
+        return self._notes
+
+    @property
+    def tempo_map(self) -> TempoMap:
+        '''
+        小节时间与视频时间的换算，按Midi文件中的速度与拍号分段进行；
+        没有Midi文件时为按 `bpM` 的固定速度
+        '''
+        if None is self.midi_fp:
+            if None is self._tempo_map:
+                self._tempo_map = TempoMap(
+                    self.tpb,
+                    bpM=self.bpM,
+                    spb=self.spb,
+                    bpB=self.bpB,
+                    InitBar=self.InitBar,
+                    BeginTime=self.BeginTime,
+                    )
+            return self._tempo_map
+        return self.notes.tempo_map
+
+    @property
+    def tBar_count_down(self) -> float:
+        '''
+        倒计时开始的Bar时间：第一小节的最后 `CountDown` 拍，拍数按该小节的拍号计
+        '''
+        bpB = self.tempo_map.beats_per_bar(self.InitBar)
+        return (bpB - self.CountDown) / bpB + self.InitBar
+
     @property
     def duration(self):
-        if None is not self.audio:
-            duration = self.audio.duration + self.BeginTime
+        if None is not self.audio_duration:
+            duration = self.audio_duration + self.BeginTime
         else:
             duration = 0
             for clip in self.arr_clip:
                 duration = max(duration, clip.end)
         return duration
 
-    def generate_movie(
+    def script_duration(self, script: Script) -> float:
+        '''
+        不生成片段，按手稿的时间安排计算输出视频的时长（秒），
+        与 `generate_movie` 得到的视频（含裁剪）时长一致
+        '''
+        subclip_range = self.get_subclip_range()
+        if None is not subclip_range:
+            return subclip_range[1] - subclip_range[0]
+        tm = self.tempo_map
+        # 开头与倒计时都在第一小节结束时消失，其余片段在各自的范围结束时消失
+        ends = [
+            tm.timeBar2Mov(self.InitBar + 1),
+            *(tm.timeBar2Mov(p.range[1]) for p in script.paragraphs),
+            *(
+                tm.timeBar2Mov(mp.disp_range[1])
+                for mp in script.midi_patterns if None is not mp.disp_range
+                ),
+            ]
+        if None is not self.audio_duration:
+            # 背景持续到音频结束，文字或Midi段落仍可能更晚结束
+            ends.append(self.audio_duration + self.BeginTime)
+        return float(max(ends))
+
+    @classmethod
+    def from_script(cls, script: Script, **kwds) -> 'Movie':
+        '''
+        按手稿生成包含所有段落的视频（与 `run.py` 的流程一致）
+
+        Parameters
+        ---
+        script:
+            - 读取好的手稿
+        kwds:
+            - 覆盖手稿中的设置
+        '''
+        session_data = {**script.session_data, **kwds}
+        song_data = session_data
+        if session_data.get('draft', CONFIG.draft):
+            # Midi画面（clip方式）同样按草稿尺寸绘制
+            h, w = draft_size(
+                session_data.get('h') or CONFIG.h,
+                session_data.get('w') or CONFIG.w,
+                session_data.get('draft_scale') or CONFIG.draft_scale,
+                )
+            song_data = {**session_data, 'h': h, 'w': w}
+        render_mode = session_data.get('midi_render_mode')
+        if 'clip' == (render_mode or CONFIG.midi_render_mode):
+            # Song 建立时可能已创建figure，需在此之前应用绘图样式
+            apply_plot_style()
+        song = mm.Song(session_data['midi_fp'], **song_data)
+        mov = cls(song=song, **session_data)
+        mov.arr_clip.clear()
+        mov.make_section_Title()
+        mov.make_section_CountDown()
+        mov.make_section_Para(script.paragraphs)
+        mov.make_section_Midi(script.midi_patterns)
+        mov.make_section_Background()
+        return mov
+
+    def get_subclip_range(
             self,
             subclip_tBar: list[float] = None,
             subclip_tMov: list[float] = None
-        ):
-        comp_vc = CompositeClip(self.arr_clip, size=(self.w, self.h))
+        ) -> Union[tuple[float, float], None]:
+        '''
+        返回输出视频的裁剪范围（秒），不裁剪时返回None
+        '''
         subclip_tBar = subclip_tBar or self.subclip_tBar
         subclip_tMov = subclip_tMov or self.subclip_tMov
         if None is not subclip_tBar:
-            comp_vc = comp_vc.subclipped(
-                self.visualizer.timeBar2Mov(subclip_tBar[0]),
-                self.visualizer.timeBar2Mov(subclip_tBar[1])
+            return (
+                self.tempo_map.timeBar2Mov(subclip_tBar[0]),
+                self.tempo_map.timeBar2Mov(subclip_tBar[1])
                 )
         elif None is not subclip_tMov:
-            comp_vc = comp_vc.subclipped(
-                subclip_tMov[0],
-                subclip_tMov[1],
-                )
+            return subclip_tMov[0], subclip_tMov[1]
+        return None
+
+    def get_audio_offset(self) -> float:
+        '''
+        音频在输出视频中的起始时间（秒），已扣除裁剪范围的起点
+        '''
+        subclip_range = self.get_subclip_range()
+        return self.BeginTime - (subclip_range[0] if subclip_range else 0)
+
+    def generate_movie(
+            self,
+            subclip_tBar: list[float] = None,
+            subclip_tMov: list[float] = None,
+            fps: float = None
+        ):
+        '''
+        合成所有片段并按裁剪范围截取
+
+        Parameters
+        ---
+        fps:
+            - 输出帧率。给出时按该帧率编译片段调度表（见 `CompositeClip.compile`）
+        '''
+        print(self.text_cache.summary())
+        comp_vc = CompositeClip(self.arr_clip, size=(self.w, self.h))
+        subclip_range = self.get_subclip_range(subclip_tBar, subclip_tMov)
+        if None is not fps:
+            comp_vc.compile(fps, subclip_range[0] if subclip_range else 0.)
+        if None is not subclip_range:
+            comp_vc = comp_vc.subclipped(*subclip_range)
         return comp_vc
 
     def make_section_Background(self):
@@ -105,10 +325,7 @@ class Movie():
                 )
         vc_bg: me.ImageClip = vc_bg.with_duration(self.duration
                                                  ).with_layer_index(-1)
-        if self.audio is not None:
-            self.audio = self.audio.with_start(self.BeginTime)
-            vc_bg = vc_bg.with_audio(self.audio)
-        self.arr_clip.insert(0, vc_bg)
+        self.arr_clip.insert(0, mark_static(vc_bg))
 
     def make_section_Title(self):
         '''
@@ -117,136 +334,219 @@ class Movie():
         if (None is self.Title) or ('omit' == self.Title.lower()):
             # 跳过开头
             return
-        tc_title = me.TextClip(
+        tc_title = self.text_cache.clip(
             text=self.Title,
             color='#EAEAEA',
             font=self.FontPath,
-            font_size=96,
+            font_size=round(96 * self.scale),
             text_align='center',  # margin=(0, 9.6),
             )
-        tc_title: me.TextClip = tc_title.with_position(('center', 0.27),
+        tc_title: TextRasterClip = tc_title.with_position(('center', 0.27),
                                                         relative=True)
-        tc_title: me.TextClip = tc_title.with_duration(
-            self.song.visualizer.spanBar2True(1) + self.BeginTime
+        tc_title: TextRasterClip = tc_title.with_duration(
+            self.tempo_map.timeBar2Mov(self.InitBar + 1)
             )
-        self.arr_clip.append(tc_title)
+        self.arr_clip.append(mark_static(tc_title))
 
         if (None is self.Saying) or ('omit' == self.Saying.lower()):
             # 跳过格言
             return
-        tc_saying = me.TextClip(
+        tc_saying = self.text_cache.clip(
             text=self.Saying,
             color='#C1C1C1',
             font=self.FontPath,
-            font_size=48,
+            font_size=round(48 * self.scale),
             text_align='center',  # margin=(0, 4.8),
             )
-        tc_saying: me.TextClip = tc_saying.with_position(('center', 0.64),
+        tc_saying: TextRasterClip = tc_saying.with_position(('center', 0.64),
                                                             relative=True)
-        tc_saying: me.TextClip = tc_saying.with_duration(
-            self.song.visualizer.spanBar2True((self.bpB - self.CountDown)
-                                                / self.bpB)
-            + self.BeginTime
+        tc_saying: TextRasterClip = tc_saying.with_duration(
+            self.tempo_map.timeBar2Mov(self.tBar_count_down)
             )
-        self.arr_clip.append(tc_saying)
+        self.arr_clip.append(mark_static(tc_saying))
 
-        tc_name = me.TextClip(
+        tc_name = self.text_cache.clip(
             text=self.Name,
             color='#C1C1C1',
             font=self.FontPath,
-            font_size=48,
+            font_size=round(48 * self.scale),
             text_align='center',  # margin=(0, 4.8),
             )
-        tc_name: me.TextClip = tc_name.with_position((0.65, 0.75),
+        tc_name: TextRasterClip = tc_name.with_position((0.65, 0.75),
                                                         relative=True)
-        tc_name: me.TextClip = tc_name.with_duration(
-            self.song.visualizer.spanBar2True((self.bpB - self.CountDown)
-                                                / self.bpB)
-            + self.BeginTime
+        tc_name: TextRasterClip = tc_name.with_duration(
+            self.tempo_map.timeBar2Mov(self.tBar_count_down)
             )
-        self.arr_clip.append(tc_name)
+        self.arr_clip.append(mark_static(tc_name))
 
     def make_section_CountDown(self):
         '''
         设置倒计时
         '''
-        tc_circle = me.TextClip(
+        tm = self.tempo_map
+        bpB = tm.beats_per_bar(self.InitBar)
+        tBar_count = self.tBar_count_down
+        tc_circle = self.text_cache.clip(
             text='●',
             color='#222222',
             font=self.FontPath,
-            font_size=400,
+            font_size=round(400 * self.scale),
             text_align='center',  # margin=(400 * 0.1, 400 * 0.1)
             ).with_position(
                 ('center', 0.404), relative=True
                 ).with_duration(
-                    self.visualizer.spanBar2True(
-                        self.CountDown / self.bpB
-                        )
-                    ).with_start(
-                        self.visualizer
-                        .timeBar2Mov((self.bpB - self.CountDown) / self.bpB
-                                        + self.InitBar)
-                        )
-        self.arr_clip.append(tc_circle)
+                    tm.span(tBar_count, self.InitBar + 1)
+                    ).with_start(tm.timeBar2Mov(tBar_count))
+        self.arr_clip.append(mark_static(tc_circle))
         for i in range(self.CountDown, 0, -1):
-            tc_count_down = me.TextClip(
+            tBar_i = (bpB - i) / bpB + self.InitBar
+            tc_count_down = self.text_cache.clip(
                 text=f'{i}',
                 color='#CCCCCC',
                 font=self.FontPath,
-                font_size=106,
+                font_size=round(106 * self.scale),
                 text_align='center',  # margin=(106 * 0.1, 106 * 0.1)
                 ).with_position(
                     ('center', 0.575), relative=True
                     ).with_duration(
-                        self.visualizer.spanBar2True(1 / self.bpB)
-                        ).with_start(
-                            self.visualizer.timeBar2Mov((self.bpB - i)
-                                                        / self.bpB
-                                                        + self.InitBar)
-                            )
-            self.arr_clip.append(tc_count_down)
+                        tm.span(tBar_i, tBar_i + 1 / bpB)
+                        ).with_start(tm.timeBar2Mov(tBar_i))
+            self.arr_clip.append(mark_static(tc_count_down))
 
     def make_section_Midi(self, midi_patterns: list[MidiPattern]):
+        if 'raster' == self.midi_render_mode:
+            return self.make_section_Midi_Raster(midi_patterns)
+        if 'blit' == self.midi_render_mode:
+            return self.make_section_Midi_Blit(midi_patterns)
+        tm = self.tempo_map
+        vis = self.visualizer
         for mp in midi_patterns:
             print(f'processing MidiPattern {mp.range}\n{mp.channels}\n')
-            self.visualizer.channel_alt_name = mp.channels
+            vis.channel_alt_name = mp.channels
             vc_mid = self.song[
                 mp.range[0]:mp.range[1],
                 list(mp.channels.keys()),
                 ].generate_clip(mp.disp_range)
+            t_start = tm.timeBar2Mov(mp.disp_range[0])
+            # melody_machine按固定速度 `bpM` 移动时间线：先查速度表得到小节时间，
+            # 再换算为固定速度下的片段时间，变速时与 raster/blit 方式一致
+            vc_mid = vc_mid.time_transform(
+                lambda t, t0=t_start, tBar0=mp.disp_range[0]: vis.spanBar2True(
+                    tm.timeMov2Bar(t0 + t) - tBar0
+                    ),
+                apply_to=['mask'],
+                )
             vc_mid = vc_mid.with_position(
                 (0.095, 0.47), relative=True
-                ).with_duration(
-                    self.visualizer
-                    .spanBar2True(mp.disp_range[1] - mp.disp_range[0])
-                    ).with_start(
-                        self.visualizer.timeBar2Mov(mp.disp_range[0])
-                        )
-            self.arr_clip.append(vc_mid)
+                ).with_duration(tm.span(*mp.disp_range)).with_start(t_start)
+            self.arr_clip.append(mark_fixed_position(vc_mid))
+
+    def get_pianoroll_renderer(
+            self,
+            backend: Literal['matplotlib', 'numpy'] = None
+        ) -> PianoRollRenderer:
+        '''
+        创建钢琴卷帘底图的绘制器，默认按 `pianoroll_backend` 选择
+        '''
+        backend = backend or self.pianoroll_backend
+        kwds = dict(
+            scale=self.scale,
+            bpB=self.bpB,
+            expand_range=self.expand_range,
+            min_pitch_range=self.min_pitch_range,
+            tempo_map=self.tempo_map,
+            )
+        if 'numpy' == backend:
+            return NumpyPianoRollRenderer(font_path=self.FontPath, **kwds)
+        elif 'matplotlib' == backend:
+            return PianoRollRenderer(**kwds)
+        raise ValueError(f'未知的绘制后端 {backend}')
+
+    def get_raster_cache(self) -> Union[DiskCache, None]:
+        '''
+        Midi底图的磁盘缓存，`raster_cache_size` 为0时不使用缓存
+        '''
+        if not self.raster_cache_size:
+            return None
+        return DiskCache(
+            self.cache_dir / 'rasters',
+            max_bytes=int(self.raster_cache_size * 2**20),
+            )
+
+    def make_section_Midi_Raster(self, midi_patterns: list[MidiPattern]):
+        '''
+        采用静态底图加NumPy时间线的方式：
+        每个Midi段落只栅格化一次，逐帧仅绘制时间线所在的几列像素
+        '''
+        renderer = self.get_pianoroll_renderer()
+        tm = self.tempo_map
+        for mp in midi_patterns:
+            print(f'processing MidiPattern {mp.range}\n{mp.channels}\n')
+            self.notes.put_midi_data(mp)
+        if None is self._raster_dir:
+            # 底图的内存映射文件需要保留到视频写出为止
+            self._raster_dir = TemporaryDirectory(
+                prefix='midi_raster_', ignore_cleanup_errors=True
+                )
+        rasters = prerender_patterns(
+            renderer,
+            midi_patterns,
+            self._raster_dir.name,
+            workers=self.prerender_workers,
+            cache=self.get_raster_cache(),
+            executor=self.prerender_executor,
+            )
+        for mp, (raster, layout) in zip(midi_patterns, rasters):
+            t_start = tm.timeBar2Mov(mp.disp_range[0])
+            vc_mid = PlayheadClip(
+                raster,
+                layout,
+                # 片段内的时间换算回视频时间后查速度表，变速时时间线同样准确
+                time2bar=lambda t, t0=t_start: tm.timeMov2Bar(t0 + t),
+                )
+            vc_mid = vc_mid.with_position(
+                (0.095, 0.47), relative=True
+                ).with_duration(tm.span(*mp.disp_range)).with_start(t_start)
+            self.arr_clip.append(mark_fixed_position(vc_mid))
+
+    def make_section_Midi_Blit(self, midi_patterns: list[MidiPattern]):
+        '''
+        底图与时间线都由matplotlib绘制，保持matplotlib的画面：
+        每个Midi段落只完整绘制一次，逐帧仅局部重绘时间线
+        '''
+        renderer = self.get_pianoroll_renderer('matplotlib')
+        tm = self.tempo_map
+        for mp in midi_patterns:
+            print(f'processing MidiPattern {mp.range}\n{mp.channels}\n')
+            self.notes.put_midi_data(mp)
+            t_start = tm.timeBar2Mov(mp.disp_range[0])
+            vc_mid = renderer.blit_clip(
+                mp, lambda t, t0=t_start: tm.timeMov2Bar(t0 + t)
+                )
+            vc_mid = vc_mid.with_position(
+                (0.095, 0.47), relative=True
+                ).with_duration(tm.span(*mp.disp_range)).with_start(t_start)
+            self.arr_clip.append(mark_fixed_position(vc_mid))
 
     def make_section_Para(self, paragraphs: list[Paragraph]):
         for paragraph in paragraphs:
-            tc_anno = me.TextClip(
+            tc_anno = self.text_cache.clip(
                 text=paragraph.text,
                 color='#EAEAEA',
                 font=self.FontPath,
-                font_size=64,
+                font_size=round(64 * self.scale),
                 # size = (1664, 940),
                 text_align='left',
-                interline=64 * 0.3,  # margin=(0,64*0.18),
+                interline=64 * 0.3 * self.scale,  # margin=(0,64*0.18),
                 ).with_position(
                     (0.115, 0.13),
                     relative=True,
                     ).with_duration(
-                        self.visualizer.spanBar2True(
-                            paragraph.range[1] - paragraph.range[0]
-                            )
+                        self.tempo_map.span(*paragraph.range)
                         ).with_start(
-                            self.visualizer.timeBar2Mov(
-                                paragraph.range[0]
-                                )
+                            self.tempo_map.timeBar2Mov(paragraph.range[0])
                             )
-            self.arr_clip.append(tc_anno)
+            self.arr_clip.append(mark_static(tc_anno))
             # print(f'processing Paragraph {paragraph.range}\n{paragraph.text}\n\n')
             print(f'processing Paragraph {paragraph}\n')
 
@@ -309,9 +609,11 @@ class CompositeClip(VideoClip):
             bg_clip = clips[0]
             self.clips = clips[1:]
         elif None is bg_clip:
-            bg_clip = me.ImageClip(
-                np.zeros([size[1], size[0], 4]) + np.array(bg_color),
-                duration=self.duration
+            bg_clip = mark_static(
+                me.ImageClip(
+                    np.zeros([size[1], size[0], 4]) + np.array(bg_color),
+                    duration=self.duration
+                    )
                 )
             self.clips = clips
         else:
@@ -319,6 +621,8 @@ class CompositeClip(VideoClip):
         self.fps = max(fpss) if fpss else None
         # order self.clips by layer
         self.bg = bg_clip
+        # 预先建立时间索引，逐帧查询时不再遍历全部片段
+        self.timeline = ClipTimeline(self.clips)
 
         # compute audio
         audioclips = [v.audio for v in clips if v.audio is not None]
@@ -326,36 +630,86 @@ class CompositeClip(VideoClip):
             self.audio = CompositeAudioClip(audioclips)
 
         self.BeginTime = BeginTime
+        self.blender = LayerBlender()
+        # 当前区间的静态底图缓存
+        self._base_index: int = None
+        self._base: np.ndarray = None
+        # 当前区间内静态图层的预乘RGBA缓存 {id(clip): (区域, 前景)}
+        self._layers_index: int = None
+        self._layers: dict[int, tuple] = {}
+        # 位置固定的片段的像素偏移 {id(clip): (x, y)}
+        self._offsets: dict[int, tuple[int, int]] = {}
+        # 最近一次合成的帧的标识（见 `frame_key`），`with_*` 与 `subclipped` 的副本共用
+        self._frame_key: list = [None]
+
+    def compile(self, fps: float, t0: float = 0.) -> 'CompositeClip':
+        '''
+        按输出帧率把片段的起止时间编译为整数帧区间，并预先计算位置固定的片段的像素偏移
+
+        之后逐帧合成时先把时间舍入到帧，调度只是整数查找，
+        边界帧的结果与从哪一帧开始渲染无关
+
+        Parameters
+        ---
+        t0:
+            - 第0帧对应的时间，即输出视频裁剪范围的起点
+        '''
+        self.timeline = FrameSchedule(self.clips, fps, t0)
+        self._base_index, self._base = None, None
+        self._layers_index, self._layers = None, {}
+        self._offsets = {
+            id(clip): self.clip_position(clip, 0)
+            for clip in self.clips
+            if has_fixed_position(clip)
+            }
+        return self
+
+    def clip_position(
+            self,
+            clip: VideoClip,
+            clip_t: float
+        ) -> tuple[int, int]:
+        '''
+        片段左上角在画面中的像素位置
+        '''
+        offset = self._offsets.get(id(clip))
+        if offset is not None:
+            return offset
+        return compute_position(
+            clip.size,
+            self.size,
+            pos=clip.pos(clip_t),
+            relative=clip.relative_pos
+            )
 
     def frame_function(self, t):
         """The clips playing at time `t` are blitted over one another."""
-        # Try doing clip merging with pillow
-        bg_t = t - self.bg.start
-        bg_frame: np.ndarray = self.bg.get_frame(bg_t).astype("uint8")
+        t = self.timeline.snap(t)
+        i = self.timeline.segment_index(t)
+        clips = self.timeline.segments[i] if i >= 0 else ()
+        if self._layers_index != i:
+            # 进入新区间时只保留仍在播放的静态图层
+            ids = {id(clip) for clip in clips}
+            self._layers = {k: v for k, v in self._layers.items() if k in ids}
+            self._layers_index = i
+        if is_static_clip(self.bg):
+            # 背景与其上方的静态图层已预先合成，只需叠加动态图层
+            n_static = self.timeline.static_counts[i] if i >= 0 else 0
+            base = self.static_base(i, t)
+            if n_static == len(clips) and base.shape[2] == 3:
+                # 没有动态图层时画面就是所在区间的底图
+                self._frame_key[0] = base
+                return base.copy()
+            current_frame = base.copy()
+        else:
+            n_static = 0
+            bg_t = t - self.bg.start
+            current_frame = self.bg.get_frame(bg_t).astype("uint8")
 
+        self._frame_key[0] = None
         # For each clip apply on top of current img
-        current_frame = bg_frame
-        for clip in self.playing_clips(t):
-            clip: VideoClip
-            clip_t = t - clip.start
-            fg: np.ndarray = clip.get_frame(clip_t)
-            if clip.mask:
-                fg = np.dstack([
-                    fg, clip.mask.get_frame(clip_t)[:, :, None] * 255
-                    ])
-            (x1, y1) = compute_position(
-                clip.size,
-                self.size,
-                pos=clip.pos(clip_t),
-                relative=clip.relative_pos
-                )
-            w = min(clip.size[0], self.size[0] - x1)
-            h = min(clip.size[1], self.size[1] - y1)
-            x2 = x1 + w
-            y2 = y1 + h
-            fg = fg[0:h, 0:w]
-            bg = current_frame[y1:y2, x1:x2]
-            current_frame[y1:y2, x1:x2] = layer_mix(bg, fg)
+        for clip in clips[n_static:]:
+            self.blit(current_frame, clip, t)
 
         frame = current_frame
 
@@ -364,11 +718,119 @@ class CompositeClip(VideoClip):
 
         return frame
 
+    def frame_key(self):
+        '''
+        最近一次合成的帧的标识：只有静态图层时为所在区间的底图，否则为None
+
+        两帧的标识是同一个对象时画面完全相同，写入端据此直接重发
+        上一帧已转换好的数据（见 `write_videofile`）；标识只用于比较，不应修改
+        '''
+        return self._frame_key[0]
+
+    def static_base(self, i: int, t: float) -> np.ndarray:
+        '''
+        返回第i个区间的静态底图，即背景及其上方连续的静态图层的合成结果
+
+        只缓存当前所在的区间，进入新区间时旧的底图随即释放，
+        因此内存占用始终只有一帧。底图是只读的，同一区间内返回的是同一个数组
+        '''
+        if self._base_index != i or self._base is None:
+            self._base = None
+            bg_t = t - self.bg.start
+            base = self.bg.get_frame(bg_t).astype("uint8")
+            if i >= 0:
+                n_static = self.timeline.static_counts[i]
+                for clip in self.timeline.segments[i][:n_static]:
+                    self.blit(base, clip, t)
+            base.flags.writeable = False
+            self._base_index = i
+            self._base = base
+        return self._base
+
+    def blit(self, current_frame: np.ndarray, clip: VideoClip, t: float):
+        '''
+        将片段在时间t的画面就地混合到current_frame上
+        '''
+        if is_static_clip(clip) and current_frame.shape[2] == 3:
+            # 静态图层直接叠加缓存的预乘RGBA，不再逐帧取画面和遮罩
+            (rows, cols), fg = self.static_layer(clip, t)
+            if isinstance(fg, tuple):
+                self.blender.blend_premultiplied(current_frame[rows, cols], fg)
+            else:
+                current_frame[rows, cols] = fg
+            return
+        clip_t = t - clip.start
+        fg: np.ndarray = clip.get_frame(clip_t)
+        alpha = None
+        if clip.mask:
+            alpha = self.blender.alpha_from_mask(clip.mask.get_frame(clip_t))
+        (x1, y1) = self.clip_position(clip, clip_t)
+        w = min(clip.size[0], self.size[0] - x1)
+        h = min(clip.size[1], self.size[1] - y1)
+        x2 = x1 + w
+        y2 = y1 + h
+        fg = fg[0:h, 0:w]
+        if alpha is not None:
+            alpha = alpha[0:h, 0:w]
+        # 直接在当前帧的切片上就地混合
+        self.blender.blend(current_frame[y1:y2, x1:x2], fg, alpha)
+
+    def static_layer(
+            self,
+            clip: VideoClip,
+            t: float
+        ) -> tuple[tuple[slice, slice], np.ndarray]:
+        '''
+        返回静态片段在画面中的区域，以及裁剪好的前景  
+        有遮罩时为 `prepare_premultiplied` 展开的预乘前景
+        （只保留不透明度非零的外接矩形），否则为RGB
+
+        每个片段只生成一次；`TextRasterClip` 直接使用其缓存的预乘栅格
+        '''
+        layer = self._layers.get(id(clip))
+        if layer is not None:
+            return layer
+        clip_t = t - clip.start
+        (x1, y1) = self.clip_position(clip, clip_t)
+        w = min(clip.size[0], self.size[0] - x1)
+        h = min(clip.size[1], self.size[1] - y1)
+        premultiplied = getattr(clip, 'premultiplied', None)
+        if premultiplied is not None:
+            fg = premultiplied[0:h, 0:w]
+        elif clip.mask:
+            fg = premultiply(
+                clip.get_frame(clip_t)[0:h, 0:w, :3],
+                clip.mask.get_frame(clip_t)[0:h, 0:w],
+                )
+        else:
+            fg = clip.get_frame(clip_t)[0:h, 0:w, :3].astype(np.uint8)
+        y0, x0 = 0, 0
+        if fg.shape[2] == 4:
+            # 去掉四周完全透明的部分
+            rows = np.flatnonzero(fg[..., 3].any(axis=1))
+            cols = np.flatnonzero(fg[..., 3].any(axis=0))
+            if len(rows) == 0:
+                y0, h, x0, w = 0, 0, 0, 0
+            else:
+                y0, h = rows[0], rows[-1] + 1 - rows[0]
+                x0, w = cols[0], cols[-1] + 1 - cols[0]
+            fg = self.blender.prepare_premultiplied(
+                fg[y0:y0 + h, x0:x0 + w]
+                )
+        else:
+            fg = np.ascontiguousarray(fg)
+        layer = (
+            (slice(y1 + y0, y1 + y0 + h), slice(x1 + x0, x1 + x0 + w)),
+            fg,
+            )
+        self._layers[id(clip)] = layer
+        return layer
+
     def playing_clips(self, t=0):
         """Returns a list of the clips in the composite clips that are
         actually playing at the given time `t`.
         """
-        return [clip for clip in self.clips if clip.is_playing(t)]
+        return list(self.timeline.playing(t))
 
     def close(self):
         """Closes the instance, releasing all the resources."""
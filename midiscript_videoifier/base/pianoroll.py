@@ -0,0 +1,427 @@
+import numpy as np
+from typing import Callable
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from moviepy import VideoClip
+from .components import MidiPattern
+from .midi import MidiNotes
+from .tempo import TempoMap
+from ..utils import make_key
+from ..utils.blit import timeline_frame_function
+
+from ..configs.default import CONFIG, COLOR, PLOT_STYLE
+
+# yapf: disable
+# 键盘位置
+KEYBOARD_BLACK = (
+    np.tile(np.arange(2, 9) * 12, (5, 1)) + np.array([[1, 3, 6, 8, 10]]).T
+    ).flatten('F')
+KEYBOARD_WHITE = (
+    np.tile(np.arange(2, 9) * 12, (7, 1)) + np.array([[0, 2, 4, 5, 7, 9, 11]]).T
+    ).flatten('F')
+KEYBOARD_WHITE_C2E = (
+    np.tile(np.arange(2, 9) * 12, (1, 1)) + np.array([[2]]).T
+    ).flatten('F')
+KEYBOARD_WHITE_F2B = (
+    np.tile(np.arange(2, 9) * 12, (1, 1)) + np.array([[8]]).T
+    ).flatten('F')
+KEYBOARD_WHITE_C = (
+    np.tile(np.arange(2, 9) * 12, (1, 1)) + np.array([[0.25]]).T
+    ).flatten('F')
+# yapf: enable
+
+
+class PianoRollLayout():
+    '''
+    单个Midi段落的钢琴卷帘画面布局
+
+    所有的尺寸都以 2160x1080 为基准，再乘以缩放系数 `scale` 。
+    绘制后端与时间线都从这里换算像素坐标，保证二者严格对齐
+    '''
+    FIGSIZE = (6.4, 1.8)  # 英寸
+    DPI = 600 * 0.47  # 缩放系数为1时的dpi
+    RECT_BG = (0, 0.1, 1, 0.9)  # 键盘与背景栏
+    RECT_MASK = (0, 0, 1, 0.1)  # 底部刻度区域
+    RECT_FG = (0.05, 0.1, 0.95, 0.9)  # 音符与小节线
+    TIMELINE_WIDTH = 1.5  # 时间线线宽（pt），即matplotlib的默认线宽
+
+    def __init__(
+            self,
+            midipattern: MidiPattern,
+            scale: float = 1.0,
+            bpB: int = None,
+            expand_range: list[float] = None,
+            min_pitch_range: list[float] = None,
+            tempo_map: TempoMap = None,
+        ) -> None:
+        '''
+        Parameters
+        ---
+        midipattern:
+            - 已经通过 `put_midi_data` 填充了音符的Midi段落
+        scale:
+            - 缩放系数，相对于2160x1080而言
+        tempo_map:
+            - 按各小节的拍号划分拍线，为空时每小节固定为 `bpB` 拍
+        '''
+        self.scale = scale
+        self.bpB = bpB or CONFIG.bpB
+        self.dpi = PianoRollLayout.DPI * scale
+        self.width = PianoRollLayout.FIGSIZE[0] * self.dpi
+        self.height = PianoRollLayout.FIGSIZE[1] * self.dpi
+        self.shape = (int(self.height), int(self.width))
+        self.ylim = MidiNotes.get_disp_pitch_range(
+            midipattern.pitch_range,
+            expand_range or CONFIG.expand_range,
+            min_pitch_range or CONFIG.min_pitch_range,
+            )
+        # 小节线覆盖整小节，因此显示范围会被刻度撑大到刻度的外边界
+        x0, x1 = midipattern.range
+        self.major_ticks = np.arange(np.floor(x0), np.ceil(x1) + 1)
+        self.minor_ticks = np.arange(
+            np.floor(x0), np.ceil(x1) + 1, 1 / self.bpB
+            ) if None is tempo_map else tempo_map.beat_grid(
+                np.floor(x0), np.ceil(x1) + 1
+                )
+        self.xlim = [
+            min(x0, self.major_ticks[0], self.minor_ticks[0]),
+            max(x1, self.major_ticks[-1], self.minor_ticks[-1]),
+            ]
+
+    def axes_px(self, rect: tuple[float]) -> tuple[float]:
+        '''
+        将figure坐标系下的轴域 [left, bottom, width, height]
+        换算为像素边界 (left, top, right, bottom)，行号从上往下计
+        '''
+        left, bottom, width, height = rect
+        return (
+            left * self.width,
+            self.height - (bottom+height) * self.height,
+            (left+width) * self.width,
+            self.height - bottom * self.height,
+            )
+
+    def bar2px(self, t_bar):
+        '''
+        小节时间 -> 像素列坐标，支持数组
+        '''
+        left, _, right, _ = self.axes_px(PianoRollLayout.RECT_FG)
+        return left + (np.asarray(t_bar) - self.xlim[0]) / (
+            self.xlim[1] - self.xlim[0]
+            ) * (right-left)
+
+    def pitch2px(self, pitch):
+        '''
+        音高 -> 像素行坐标，支持数组
+        '''
+        _, top, _, bottom = self.axes_px(PianoRollLayout.RECT_FG)
+        return bottom - (np.asarray(pitch) - self.ylim[0]) / (
+            self.ylim[1] - self.ylim[0]
+            ) * (bottom-top)
+
+    def pt2px(self, pt: float) -> float:
+        '''
+        磅值 -> 像素
+        '''
+        return pt * self.dpi / 72
+
+
+class PianoRollRenderer():
+    '''
+    基于matplotlib的钢琴卷帘绘制器，画面与旧版 `MidiVisualizer` 一致
+
+    每个Midi段落只绘制一次静态底图（不含时间线）。
+    直接使用 `Figure` 与 `FigureCanvasAgg` ，样式按实例设置，不经过pyplot的全局状态，
+    因此可以在多个线程中同时绘制
+    '''
+    VERSION = 1  # 画面有变化时递增
+
+    def __init__(
+            self,
+            scale: float = 1.0,
+            bpB: int = None,
+            expand_range: list[float] = None,
+            min_pitch_range: list[float] = None,
+            style: dict = None,
+            tempo_map: TempoMap = None,
+        ) -> None:
+        self.scale = scale
+        self.bpB = bpB or CONFIG.bpB
+        self.expand_range = expand_range or CONFIG.expand_range
+        self.min_pitch_range = min_pitch_range or CONFIG.min_pitch_range
+        # 拍线按Midi文件中的拍号划分
+        self.tempo_map = tempo_map
+        # 覆盖 `PLOT_STYLE` 中的项
+        self.style = {**PLOT_STYLE, **(style or {})}
+
+    def layout(self, midipattern: MidiPattern) -> PianoRollLayout:
+        return PianoRollLayout(
+            midipattern,
+            scale=self.scale,
+            bpB=self.bpB,
+            expand_range=self.expand_range,
+            min_pitch_range=self.min_pitch_range,
+            tempo_map=self.tempo_map,
+            )
+
+    def style_token(self):
+        '''
+        绘制器自身影响画面的设置（字体等），用于计算缓存键
+        '''
+        return self.style
+
+    def cache_key(self, midipattern: MidiPattern) -> str:
+        '''
+        底图的缓存键，涵盖所有影响底图像素的内容：
+        音符、范围、轨道及替换名称、音高范围、拍线、缩放、配色与绘制器版本
+
+        !Warning 需在 `put_midi_data` 之后调用
+        '''
+        return make_key(
+            type(self).__name__,
+            self.VERSION,
+            self.style_token(),
+            self.scale,
+            self.bpB,
+            self.expand_range,
+            self.min_pitch_range,
+            midipattern.range,
+            midipattern.disp_range,
+            midipattern.channels,
+            midipattern.pitch_clip_range,
+            midipattern.pitch_range,
+            midipattern.mtracks,
+            self.layout(midipattern).minor_ticks,
+            {k: v for k, v in vars(COLOR).items() if not k.startswith('__')},
+            )
+
+    def render(self, midipattern: MidiPattern):
+        '''
+        绘制Midi段落的静态底图
+
+        Return
+        ---
+        (rgba shape[h,w,4] uint8, PianoRollLayout)
+        '''
+        layout = self.layout(midipattern)
+        fig, ax_bg, ax_fg = self._init_figure(layout)
+        self._draw_pattern(midipattern, layout, ax_bg, ax_fg)
+        fig.canvas.draw()
+        raster = np.array(fig.canvas.buffer_rgba())
+        return raster, layout
+
+    def blit_clip(
+            self,
+            midipattern: MidiPattern,
+            time2bar: Callable[[float], float],
+        ) -> VideoClip:
+        '''
+        时间线同样由matplotlib绘制的钢琴卷帘片段：
+        底图只完整绘制一次，逐帧用局部重绘（blitting）只绘制时间线
+
+        Parameters
+        ---
+        time2bar:
+            - 片段内时间（秒） -> 小节时间 `tBar`
+        '''
+        layout = self.layout(midipattern)
+        fig, ax_bg, ax_fg = self._init_figure(layout)
+        self._draw_pattern(midipattern, layout, ax_bg, ax_fg)
+        art_timeline, *_ = ax_fg.plot(
+            [],
+            [],
+            color=COLOR.COLOR_TIME_LINE,
+            lw=PianoRollLayout.TIMELINE_WIDTH,
+            zorder=3,
+            )
+        return VideoClip(
+            frame_function=timeline_frame_function(
+                fig, art_timeline, time2bar, layout.ylim
+                )
+            )
+
+    def _init_figure(self, layout: PianoRollLayout):
+        fig = Figure(
+            figsize=PianoRollLayout.FIGSIZE,
+            dpi=layout.dpi,
+            facecolor=COLOR.COLOR_BG,
+            )
+        FigureCanvasAgg(fig)
+        facecolor = self.style['axes.facecolor']
+        ax_bg = fig.add_axes(PianoRollLayout.RECT_BG, facecolor=facecolor)
+        ax_mask = fig.add_axes(PianoRollLayout.RECT_MASK, facecolor=facecolor)
+        ax_fg = fig.add_axes(PianoRollLayout.RECT_FG, facecolor=facecolor)
+        ax_bg.set_xlim([0, 1])
+        ax_bg.axis('off')
+        [x.set_visible(False) for x in ax_mask.spines.values()]
+        ax_mask.xaxis.set_visible(False)
+        ax_mask.yaxis.set_visible(False)
+        ax_mask.set_facecolor(COLOR.COLOR_BG)
+        [x.set_visible(False) for x in ax_fg.spines.values()]
+        ax_fg.yaxis.set_visible(False)
+        # 绘制键盘
+        ax_bg.barh(
+            y=KEYBOARD_WHITE_C2E,
+            width=0.05,
+            height=5,
+            facecolor=COLOR.COLOR_WHITE_KEY,
+            edgecolor=COLOR.COLOR_EDGE,
+            linewidth=0.2,
+            )
+        ax_bg.barh(
+            y=KEYBOARD_WHITE_F2B,
+            width=0.05,
+            height=7,
+            facecolor=COLOR.COLOR_WHITE_KEY,
+            edgecolor=COLOR.COLOR_EDGE,
+            linewidth=0.2,
+            )
+        ax_bg.barh(
+            y=KEYBOARD_WHITE_C,
+            width=0.05,
+            height=1.5,
+            facecolor=COLOR.COLOR_WHITE_C,
+            edgecolor=COLOR.COLOR_EDGE,
+            linewidth=0.2,
+            )
+        ax_bg.barh(
+            y=KEYBOARD_BLACK,
+            width=0.03,
+            height=1,
+            facecolor=COLOR.COLOR_BLACK_KEY
+            )
+
+        # 绘制背景栏
+        ax_bg.barh(
+            y=KEYBOARD_WHITE,
+            width=0.95,
+            height=1,
+            left=0.05,
+            facecolor=COLOR.COLOR_LIGHT_ROW,
+            )
+        ax_bg.barh(
+            y=KEYBOARD_BLACK,
+            width=0.95,
+            height=1,
+            left=0.05,
+            facecolor=COLOR.COLOR_DARK_ROW,
+            )
+
+        # 绘制小节线
+        ax_fg.xaxis.set_tick_params(
+            which='both',
+            colors=COLOR.COLOR_TICK,
+            direction='in',
+            labelsize=self.style['font.size'],
+            labelfontfamily=self.style['font.family'],
+            )
+        ## 设置minor=True表示设置次刻度
+        ax_fg.grid(which='minor', c=COLOR.COLOR_GRID_MINOR, ls=':', lw=0.2)
+        ax_fg.grid(which='major', c=COLOR.COLOR_GRID_MAJOR, ls='-', lw=0.2)
+        return fig, ax_bg, ax_fg
+
+    def _draw_pattern(
+            self,
+            midipattern: MidiPattern,
+            layout: PianoRollLayout,
+            ax_bg: Axes,
+            ax_fg: Axes,
+        ):
+        ylim = layout.ylim
+        ax_bg.set_ylim(ylim)
+        ax_fg.set_ylim(ylim)
+
+        # 标记音符C
+        for c in KEYBOARD_WHITE_C:
+            if ylim[0] < c < ylim[1]:
+                ax_bg.text(
+                    x=0.048,
+                    y=c,
+                    s=f'C{c//12:.0f}',
+                    fontsize=110 / (ylim[1] - ylim[0]),
+                    fontfamily=self.style['font.family'],
+                    va='center',
+                    ha='right'
+                    )
+
+        # 小节线更新
+        ax_fg.set_xticks(layout.major_ticks)
+        ax_fg.set_xticks(layout.minor_ticks, minor=True)
+        ax_fg.set_xlim(layout.xlim)
+
+        # 绘制音符
+        for chn, (lbl, trk) in enumerate(midipattern.mtracks.items()):
+            ax_fg.barh(
+                y=trk[:, 0],
+                width=trk[:, 4],
+                height=1,
+                left=trk[:, 2],
+                facecolor=COLOR.COLOR_NOTES_FACE[chn],
+                edgecolor=COLOR.COLOR_NOTE_EDGE,
+                linewidth=0.3,
+                zorder=3
+                )
+
+
+class PlayheadClip(VideoClip):
+    '''
+    钢琴卷帘片段：静态底图 + 用NumPy逐帧绘制的时间线
+
+    每帧只需复制一次底图并填充时间线所在的几列像素，
+    不再重新栅格化整张figure
+    '''
+
+    def __init__(
+            self,
+            raster: np.ndarray,
+            layout: PianoRollLayout,
+            time2bar: Callable[[float], float],
+            duration: float = None,
+        ) -> None:
+        '''
+        Parameters
+        ---
+        raster:
+            - 由 `PianoRollRenderer.render` 得到的静态底图
+        layout:
+            - 底图对应的布局
+        time2bar:
+            - 片段内时间（秒） -> 小节时间 `tBar`
+        '''
+        self.raster = np.ascontiguousarray(raster[:, :, :3])
+        self.layout = layout
+        self.time2bar = time2bar
+        _, top, _, bottom = layout.axes_px(PianoRollLayout.RECT_FG)
+        self.rows = (
+            max(int(round(top)), 0),
+            min(int(round(bottom)), self.raster.shape[0])
+            )
+        left, _, right, _ = layout.axes_px(PianoRollLayout.RECT_FG)
+        self.cols = (
+            max(int(round(left)), 0),
+            min(int(round(right)), self.raster.shape[1])
+            )
+        self.line_width = max(
+            int(round(layout.pt2px(PianoRollLayout.TIMELINE_WIDTH))), 1
+            )
+        self.color = np.round(COLOR.COLOR_TIME_LINE[:3] * 255).astype(
+            np.uint8
+            )
+        super().__init__(frame_function=self.draw_frame, duration=duration)
+
+    def playhead_columns(self, t: float) -> tuple[int, int]:
+        '''
+        时间线在时间t所占的像素列范围 [x1, x2)，已裁剪到音符区域内
+        '''
+        x = float(self.layout.bar2px(self.time2bar(t)))
+        x1 = int(round(x - self.line_width / 2))
+        x2 = x1 + self.line_width
+        return max(x1, self.cols[0]), min(x2, self.cols[1])
+
+    def draw_frame(self, t: float) -> np.ndarray:
+        frame = self.raster.copy()
+        x1, x2 = self.playhead_columns(t)
+        if x2 > x1:
+            frame[self.rows[0]:self.rows[1], x1:x2] = self.color
+        return frame
@@ -0,0 +1,137 @@
+import os
+import numpy as np
+from pathlib import Path
+from typing import Union, Literal
+from time import perf_counter
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    )
+from .components import MidiPattern
+from .pianoroll import PianoRollRenderer, PianoRollLayout
+from ..utils import DiskCache
+
+
+def render_pattern_to_file(
+        renderer: PianoRollRenderer,
+        midipattern: MidiPattern,
+        raster_fp: Union[str, Path]
+    ) -> tuple[PianoRollLayout, float]:
+    '''
+    绘制一个Midi段落的底图，并以RGB格式写入 `.npy` 内存映射文件
+
+    Return
+    ---
+    layout:
+        - 底图的像素布局
+    elapsed:
+        - 绘制耗时（秒）
+    '''
+    t0 = perf_counter()
+    raster, layout = renderer.render(midipattern)
+    out = np.lib.format.open_memmap(
+        raster_fp, mode='w+', dtype=np.uint8, shape=(*raster.shape[:2], 3)
+        )
+    out[...] = raster[:, :, :3]
+    out.flush()
+    del out
+    return layout, perf_counter() - t0
+
+
+def prerender_patterns(
+        renderer: PianoRollRenderer,
+        midi_patterns: list[MidiPattern],
+        raster_dir: Union[str, Path],
+        workers: int = None,
+        cache: DiskCache = None,
+        executor: Literal['process', 'thread'] = 'process'
+    ) -> list[tuple[np.ndarray, PianoRollLayout]]:
+    '''
+    并行地预先绘制所有Midi段落的静态底图  
+    结果写入 `raster_dir` 下的内存映射文件，主进程以只读方式映射，不经过pickle传输
+
+    Parameters
+    ---
+    midi_patterns:
+        - 已经 `put_midi_data` 的Midi段落
+    workers:
+        - 并行数，默认为CPU核心数；为1时在当前线程内绘制
+    cache:
+        - 底图的磁盘缓存，命中的段落不再绘制，新绘制的底图会移入缓存
+    executor:
+        - 'process' 进程池；'thread' 线程池。
+        绘制器不经过pyplot的全局状态，Agg栅格化与NumPy运算的大部分时间不持有GIL，
+        线程池同样可以并行，且不必为每个进程复制一份解释器与绘制器
+
+    Return
+    ---
+    与 `midi_patterns` 顺序一致的 (raster, layout) 列表，raster 为只读的 np.memmap
+    '''
+    raster_dir = Path(raster_dir)
+    results: list[tuple[np.ndarray, PianoRollLayout]] = [None] * len(
+        midi_patterns
+        )
+    keys: list[str] = [None] * len(midi_patterns)
+    if None is not cache:
+        for i, mp in enumerate(midi_patterns):
+            keys[i] = renderer.cache_key(mp)
+            raster = cache.load(keys[i])
+            if None is not raster:
+                results[i] = (raster, renderer.layout(mp))
+    todo = [i for i, result in enumerate(results) if None is result]
+    workers = min(workers or os.cpu_count(), max(len(todo), 1))
+    raster_fps = {i: raster_dir / f'pattern_{i:04d}.npy' for i in todo}
+    elapsed = {}
+    t0 = perf_counter()
+
+    def finish(i: int, layout: PianoRollLayout):
+        mp = midi_patterns[i]
+        print(
+            f'rendered MidiPattern {mp.range} {list(mp.channels.keys())} '
+            f'in {elapsed[i]:.2f}s'
+            )
+        fp = raster_fps[i]
+        if None is not cache:
+            fp = cache.store_file(keys[i], fp)
+        results[i] = (np.load(fp, mmap_mode='r'), layout)
+
+    if workers <= 1:
+        for i in todo:
+            layout, elapsed[i] = render_pattern_to_file(
+                renderer, midi_patterns[i], raster_fps[i]
+                )
+            finish(i, layout)
+    else:
+        pool_cls = {
+            'process': ProcessPoolExecutor,
+            'thread': ThreadPoolExecutor,
+            }[executor]
+        with pool_cls(workers) as pool:
+            futures = {
+                pool.submit(
+                    render_pattern_to_file,
+                    renderer,
+                    midi_patterns[i],
+                    raster_fps[i],
+                    ): i
+                for i in todo
+                }
+            for future in as_completed(futures):
+                i = futures[future]
+                layout, elapsed[i] = future.result()
+                finish(i, layout)
+    wall = perf_counter() - t0
+    total = sum(elapsed.values())
+    print(
+        f'pre-rendered {len(todo)} MidiPatterns with {workers} '
+        f'{executor} worker(s): wall {wall:.2f}s, sum {total:.2f}s, '
+        f'speedup x{total / max(wall, 1e-9):.1f}'
+        )
+    if None is not cache:
+        print(
+            f'raster cache: {len(midi_patterns) - len(todo)}'
+            f'/{len(midi_patterns)} hit ({cache.root})'
+            )
+    print()
+    return results
@@ -0,0 +1,388 @@
+import os
+import numpy as np
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+from .components import MidiPattern
+from .pianoroll import (
+    PianoRollLayout,
+    PianoRollRenderer,
+    KEYBOARD_BLACK,
+    KEYBOARD_WHITE,
+    KEYBOARD_WHITE_C2E,
+    KEYBOARD_WHITE_F2B,
+    KEYBOARD_WHITE_C,
+    )
+from .tempo import TempoMap
+
+from ..configs.default import COLOR
+from ..utils import file_digest
+
+FONT_SIZE = 10.5  # 与 PLOT_STYLE['font.size'] 一致
+# 以下均为matplotlib的默认值（pt）
+TICK_MAJOR = (3.5, 0.8)  # 主刻度长度、线宽
+TICK_MINOR = (2.0, 0.6)  # 次刻度长度、线宽
+TICK_PAD = 3.5  # 刻度标签与轴的间距
+DOTTED_DUTY = 1 / (1+1.65)  # 点线 ':' 的占空比
+
+
+@lru_cache(maxsize=64)
+def _load_font(font_path: str, size: int):
+    if font_path is not None:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except OSError:
+            pass
+    return ImageFont.load_default(size)
+
+
+class NumpyPianoRollRenderer(PianoRollRenderer):
+    '''
+    纯NumPy的钢琴卷帘绘制器
+
+    与 `PianoRollRenderer` 使用相同的 `PianoRollLayout` ，
+    直接把键盘、背景栏、小节线与音符栅格化到 uint8 RGBA 数组中。
+    所有矩形都带有亚像素覆盖率（抗锯齿），同一批矩形一次性完成填充
+    '''
+    VERSION = 1
+
+    def __init__(
+            self,
+            scale: float = 1.0,
+            bpB: int = None,
+            expand_range: list[float] = None,
+            min_pitch_range: list[float] = None,
+            font_path: str = None,
+            tempo_map: TempoMap = None,
+        ) -> None:
+        '''
+        Parameters
+        ---
+        font_path:
+            - 标签所用的字体文件，为空时使用PIL的默认字体
+        '''
+        super().__init__(
+            scale, bpB, expand_range, min_pitch_range, tempo_map=tempo_map
+            )
+        self.font_path = font_path
+
+    def style_token(self):
+        # 按字体文件的内容区分，替换同名字体后不会命中旧的底图
+        if None is self.font_path or not os.path.isfile(self.font_path):
+            return None  # 与 `_load_font` 一致，改用PIL的默认字体
+        return file_digest(self.font_path)
+
+    def render(self, midipattern: MidiPattern):
+        '''
+        绘制Midi段落的静态底图
+
+        Return
+        ---
+        (rgba shape[h,w,4] uint8, PianoRollLayout)
+        '''
+        layout = self.layout(midipattern)
+        canvas = np.empty((*layout.shape, 3), dtype=np.float32)
+        canvas[:] = COLOR.COLOR_BG[:3]
+        self._draw_keyboard(canvas, layout)
+        # 底部刻度区域以背景色覆盖（对应旧版的 ax_mask）
+        box_mask = layout.axes_px(PianoRollLayout.RECT_MASK)
+        self._fill(canvas, [box_mask], COLOR.COLOR_BG, box_mask)
+        self._draw_grid(canvas, layout)
+        self._draw_notes(canvas, midipattern, layout)
+        raster = np.empty((*layout.shape, 4), dtype=np.uint8)
+        np.multiply(canvas, 255, out=canvas)
+        canvas += 0.5
+        np.copyto(raster[..., :3], canvas, casting='unsafe')
+        raster[..., 3] = 255
+        return raster, layout
+
+    # region 栅格化基础操作
+    @staticmethod
+    def _edge_diff(x: np.ndarray):
+        '''
+        将矩形边界 x 拆分为一阶差分的两个位置与权重
+        g(c) = clamp(x - c, 0, 1) 即像素c位于x左侧的比例，
+        其差分仅在 floor(x) 与 floor(x)+1 处非零
+        '''
+        fx = np.floor(x)
+        a = x - fx
+        fx = fx.astype(np.intp)
+        return (fx, fx + 1), (a - 1, -a)
+
+    def _coverage(self, shape: tuple, rects: np.ndarray, clip: tuple):
+        '''
+        计算一批矩形的像素覆盖率（重叠部分截断到1）
+
+        每个矩形的覆盖率都是x、y两个方向的一维覆盖率之积，
+        其二维差分只在四个角附近的16个位置非零。
+        把所有矩形的差分累加后做两次cumsum，即可一次得到全部覆盖率。
+        计算只在这批矩形的外接框内进行
+
+        Parameters
+        ---
+        rects:
+            - [n,4] 的像素边界 (left, top, right, bottom)
+        clip:
+            - 裁剪边界 (left, top, right, bottom)
+
+        Return
+        ---
+        (cov, (y0, x0))，cov为外接框内的覆盖率，(y0, x0)为外接框的左上角；
+        没有可见的矩形时返回 None
+        '''
+        h, w = shape
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        left, top, right, bottom = clip
+        x0 = np.clip(rects[:, 0], max(left, 0), min(right, w))
+        x1 = np.clip(rects[:, 2], max(left, 0), min(right, w))
+        y0 = np.clip(rects[:, 1], max(top, 0), min(bottom, h))
+        y1 = np.clip(rects[:, 3], max(top, 0), min(bottom, h))
+        keep = (x1 > x0) & (y1 > y0)
+        x0, x1, y0, y1 = x0[keep], x1[keep], y0[keep], y1[keep]
+        if len(x0) == 0:
+            return None
+        # 外接框
+        bx0, by0 = int(np.floor(x0.min())), int(np.floor(y0.min()))
+        bx1 = min(int(np.floor(x1.max())) + 1, w)
+        by1 = min(int(np.floor(y1.max())) + 1, h)
+        bw, bh = bx1 - bx0, by1 - by0
+        (cx1a, cx1b), (wx1a, wx1b) = self._edge_diff(x1 - bx0)
+        (cx0a, cx0b), (wx0a, wx0b) = self._edge_diff(x0 - bx0)
+        (cy1a, cy1b), (wy1a, wy1b) = self._edge_diff(y1 - by0)
+        (cy0a, cy0b), (wy0a, wy0b) = self._edge_diff(y0 - by0)
+        cols = np.stack([cx1a, cx1b, cx0a, cx0b])
+        wcols = np.stack([wx1a, wx1b, -wx0a, -wx0b])
+        rows = np.stack([cy1a, cy1b, cy0a, cy0b])
+        wrows = np.stack([wy1a, wy1b, -wy0a, -wy0b])
+        idx = (rows[:, None] * (bw+2) + cols[None, :]).ravel()
+        val = (wrows[:, None] * wcols[None, :]).ravel()
+        D = np.bincount(idx, weights=val, minlength=(bh+2) * (bw+2))
+        D = D.reshape(bh + 2, bw + 2)
+        np.cumsum(D, axis=0, out=D)
+        np.cumsum(D, axis=1, out=D)
+        cov = D[:bh, :bw].astype(np.float32)
+        np.clip(cov, 0, 1, out=cov)
+        return cov, (by0, bx0)
+
+    def _blend(self, canvas: np.ndarray, coverage: tuple, color):
+        '''
+        按覆盖率将颜色（可带透明度）混合到画布上
+        '''
+        cov, (y0, x0) = coverage
+        color = np.asarray(color, dtype=np.float32)
+        if len(color) == 4:
+            if color[3] == 0:
+                return
+            cov = cov * color[3]
+        region = canvas[y0:y0 + cov.shape[0], x0:x0 + cov.shape[1]]
+        tmp = np.empty_like(cov)
+        for c in range(3):
+            # region += (color - region) * cov
+            np.subtract(color[c], region[..., c], out=tmp)
+            tmp *= cov
+            region[..., c] += tmp
+
+    def _fill(self, canvas, rects, color, clip):
+        coverage = self._coverage(canvas.shape[:2], rects, clip)
+        if coverage is not None:
+            self._blend(canvas, coverage, color)
+
+    def _fill_edged(self, canvas, rects, facecolor, edgecolor, lw, clip):
+        '''
+        填充带描边的矩形，描边以矩形边界为中心、宽度为lw像素
+        '''
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        self._fill(canvas, rects, facecolor, clip)
+        if lw <= 0:
+            return
+        shape = canvas.shape[:2]
+        grow = np.array([-lw / 2, -lw / 2, lw / 2, lw / 2])
+        outer = self._coverage(shape, rects + grow, clip)
+        if outer is None:
+            return
+        # 在外扩矩形的覆盖率中扣除内缩矩形的部分，剩下的就是描边
+        inner = rects - grow
+        inner = inner[(inner[:, 2] > inner[:, 0])
+                        & (inner[:, 3] > inner[:, 1])]
+        inner = self._coverage(shape, inner, clip)
+        if inner is not None:
+            cov, (oy, ox) = outer
+            cov_in, (iy, ix) = inner
+            # 内缩矩形的外接框必然落在外扩矩形的外接框内
+            cov[iy - oy:iy - oy + cov_in.shape[0],
+                ix - ox:ix - ox + cov_in.shape[1]] -= cov_in
+            np.clip(cov, 0, 1, out=cov)
+        self._blend(canvas, outer, edgecolor)
+
+    def _text(self, canvas, text, x, y, size_pt, color, anchor, dpi):
+        '''
+        用PIL绘制文字，(x, y) 为锚点的像素坐标
+        '''
+        size = max(int(round(size_pt * dpi / 72)), 1)
+        font = _load_font(self.font_path, size)
+        l, t, r, b = font.getbbox(text, anchor=anchor)
+        if r <= l or b <= t:
+            return
+        img = Image.new('L', (r - l, b - t), 0)
+        ImageDraw.Draw(img).text((-l, -t), text, fill=255, font=font,
+                                 anchor=anchor)
+        mask = np.asarray(img, dtype=np.float32) / 255
+        px, py = int(round(x)) + l, int(round(y)) + t
+        h, w = canvas.shape[:2]
+        sx0, sy0 = max(-px, 0), max(-py, 0)
+        sx1, sy1 = min(mask.shape[1], w - px), min(mask.shape[0], h - py)
+        if sx1 <= sx0 or sy1 <= sy0:
+            return
+        region = canvas[py + sy0:py + sy1, px + sx0:px + sx1]
+        a = mask[sy0:sy1, sx0:sx1, None]
+        region += (np.asarray(color[:3], dtype=np.float32) - region) * a
+
+    # endregion
+
+    def _draw_keyboard(self, canvas: np.ndarray, layout: PianoRollLayout):
+        '''
+        键盘与背景栏（对应旧版的 ax_bg）
+        '''
+        box = layout.axes_px(PianoRollLayout.RECT_BG)
+        left, top, right, bottom = box
+        ylim = layout.ylim
+
+        def x2px(x):  # ax_bg 的横轴为 [0, 1]
+            return left + np.asarray(x, dtype=np.float64) * (right-left)
+
+        def y2px(y):
+            return bottom - (np.asarray(y, dtype=np.float64) - ylim[0]) / (
+                ylim[1] - ylim[0]
+                ) * (bottom-top)
+
+        def bars(y, height, x0, width):
+            y = np.asarray(y, dtype=np.float64)
+            n = len(y)
+            return np.stack([
+                np.full(n, x2px(x0)),
+                y2px(y + height/2),
+                np.full(n, x2px(x0 + width)),
+                y2px(y - height/2),
+                ], axis=1)
+
+        lw = layout.pt2px(0.2)
+        self._fill_edged(
+            canvas, bars(KEYBOARD_WHITE_C2E, 5, 0, 0.05),
+            COLOR.COLOR_WHITE_KEY, COLOR.COLOR_EDGE, lw, box
+            )
+        self._fill_edged(
+            canvas, bars(KEYBOARD_WHITE_F2B, 7, 0, 0.05),
+            COLOR.COLOR_WHITE_KEY, COLOR.COLOR_EDGE, lw, box
+            )
+        self._fill_edged(
+            canvas, bars(KEYBOARD_WHITE_C, 1.5, 0, 0.05),
+            COLOR.COLOR_WHITE_C, COLOR.COLOR_EDGE, lw, box
+            )
+        self._fill(
+            canvas, bars(KEYBOARD_BLACK, 1, 0, 0.03),
+            COLOR.COLOR_BLACK_KEY, box
+            )
+        self._fill(
+            canvas, bars(KEYBOARD_WHITE, 1, 0.05, 0.95),
+            COLOR.COLOR_LIGHT_ROW, box
+            )
+        self._fill(
+            canvas, bars(KEYBOARD_BLACK, 1, 0.05, 0.95),
+            COLOR.COLOR_DARK_ROW, box
+            )
+        # 标记音符C
+        for c in KEYBOARD_WHITE_C:
+            if ylim[0] < c < ylim[1]:
+                self._text(
+                    canvas,
+                    f'C{c//12:.0f}',
+                    x2px(0.048),
+                    y2px(c),
+                    110 / (ylim[1] - ylim[0]),
+                    (0, 0, 0),  # matplotlib默认的文字颜色
+                    'rm',
+                    layout.dpi,
+                    )
+
+    def _draw_grid(self, canvas: np.ndarray, layout: PianoRollLayout):
+        '''
+        小节线、刻度与刻度标签（对应旧版的 ax_fg 坐标轴）
+        '''
+        box = layout.axes_px(PianoRollLayout.RECT_FG)
+        left, top, right, bottom = box
+        full = (0, 0, canvas.shape[1], canvas.shape[0])
+
+        def vlines(x, y0, y1, lw):
+            x = layout.bar2px(x)
+            n = len(x)
+            return np.stack([
+                x - lw/2, np.full(n, y0), x + lw/2, np.full(n, y1)
+                ], axis=1)
+
+        lw = layout.pt2px(0.2)
+        minor = np.setdiff1d(layout.minor_ticks, layout.major_ticks)
+        self._fill(
+            canvas,
+            vlines(minor, top, bottom, lw),
+            [*COLOR.COLOR_GRID_MINOR[:3], DOTTED_DUTY],
+            box,
+            )
+        self._fill(
+            canvas,
+            vlines(layout.major_ticks, top, bottom, lw),
+            COLOR.COLOR_GRID_MAJOR,
+            box,
+            )
+        length, width = (layout.pt2px(x) for x in TICK_MINOR)
+        self._fill(
+            canvas,
+            vlines(minor, bottom - length, bottom, width),
+            COLOR.COLOR_TICK,
+            full,
+            )
+        length, width = (layout.pt2px(x) for x in TICK_MAJOR)
+        self._fill(
+            canvas,
+            vlines(layout.major_ticks, bottom - length, bottom, width),
+            COLOR.COLOR_TICK,
+            full,
+            )
+        for x in layout.major_ticks:
+            self._text(
+                canvas,
+                f'{x:.0f}',
+                layout.bar2px(x),
+                bottom + layout.pt2px(TICK_PAD),
+                FONT_SIZE,
+                COLOR.COLOR_TICK,
+                'mt',
+                layout.dpi,
+                )
+
+    def _draw_notes(
+            self,
+            canvas: np.ndarray,
+            midipattern: MidiPattern,
+            layout: PianoRollLayout,
+        ):
+        '''
+        逐轨道批量绘制音符
+        '''
+        box = layout.axes_px(PianoRollLayout.RECT_FG)
+        lw = layout.pt2px(0.3)
+        for chn, trk in enumerate(midipattern.mtracks.values()):
+            if len(trk) == 0:
+                continue
+            rects = np.stack([
+                layout.bar2px(trk[:, 2]),
+                layout.pitch2px(trk[:, 0] + 0.5),
+                layout.bar2px(trk[:, 2] + trk[:, 4]),
+                layout.pitch2px(trk[:, 0] - 0.5),
+                ], axis=1)
+            self._fill_edged(
+                canvas,
+                rects,
+                COLOR.COLOR_NOTES_FACE[chn],
+                COLOR.COLOR_NOTE_EDGE,
+                lw,
+                box,
+                )
@@ -0,0 +1,219 @@
+import numpy as np
+from array import array
+from pathlib import Path
+from typing import Union
+
+# 一条轨道中的音符事件，按文件中的先后顺序排列
+NOTE_EVENT_DTYPE = np.dtype([
+    ('tick', np.int64),  # 绝对时间（tick）
+    ('pitch', np.uint8),  # 音高
+    ('velocity', np.uint8),  # 力度
+    ('on', np.bool_),  # 是否为音符开始（力度为0的 note_on 视为音符结束）
+    ])
+
+# 系统公共消息与系统实时消息的数据字节数（0xF4、0xF5未定义，没有数据字节）
+SYSTEM_DATA_LENGTH = {0xF1: 1, 0xF2: 2, 0xF3: 1}
+
+
+def _read_vlq(data: bytes, i: int) -> tuple[int, int]:
+    '''
+    读取变长整数，返回 (数值, 下一个字节的位置)
+    '''
+    value = 0
+    while True:
+        b = data[i]
+        i += 1
+        value = (value << 7) | (b & 0x7F)
+        if not b & 0x80:
+            return value, i
+
+
+def scan_track(
+        data: bytes,
+        tempos: list[tuple[int, int]] = None,
+        time_signatures: list[tuple[int, int, int]] = None,
+    ) -> tuple[Union[str, None], np.ndarray]:
+    '''
+    扫描一条 MTrk 的原始字节，只提取音符事件
+
+    与逐条构造 `mido.Message` 相比，这里只做整数运算，
+    其他事件按长度直接跳过
+
+    Parameters
+    ---
+    tempos:
+        - 给出时追加该轨道的速度事件 (tick, 每个四分音符的微秒数)
+    time_signatures:
+        - 给出时追加该轨道的拍号事件 (tick, 分子, 分母)
+
+    Return
+    ---
+    (轨道名称, 音符事件)
+    轨道名称只取第一个事件为 track_name 的情况（与 `MidiNotes` 的约定一致），否则为None
+    '''
+    ticks, pitches, velocities, ons = array('q'), array('B'), array('B'), []
+    name = None
+    i, n, tick, running = 0, len(data), 0, 0
+    first = True
+    while i < n:
+        delta = data[i]
+        i += 1
+        if delta & 0x80:  # 多字节的间隔时间
+            delta, i = _read_vlq(data, i - 1)
+        tick += delta
+        status = data[i]
+        if status & 0x80:
+            i += 1
+        elif running:  # 沿用上一个通道消息的状态字节
+            status = running
+        else:
+            raise ValueError(f'第 {i} 字节处的数据字节之前没有通道消息的状态字节')
+        if 0xFF == status:  # 元事件
+            meta_type = data[i]
+            length, i = _read_vlq(data, i + 1)
+            if first and 0x03 == meta_type:
+                name = data[i:i + length].decode('latin1')
+            elif 0x51 == meta_type and None is not tempos:
+                tempos.append((tick, int.from_bytes(data[i:i + 3], 'big')))
+            elif 0x58 == meta_type and None is not time_signatures:
+                time_signatures.append((tick, data[i], 2**data[i + 1]))
+            i += length
+        elif 0xF0 == status or 0xF7 == status:  # 系统专用消息
+            length, i = _read_vlq(data, i)
+            i += length
+        elif 0xF0 < status:  # 系统公共消息与系统实时消息
+            i += SYSTEM_DATA_LENGTH.get(status, 0)
+        else:
+            running = status
+            kind = status & 0xF0
+            if 0xC0 == kind or 0xD0 == kind:
+                i += 1
+            else:
+                if 0x90 == kind or 0x80 == kind:
+                    velocity = data[i + 1]
+                    ticks.append(tick)
+                    pitches.append(data[i])
+                    velocities.append(velocity)
+                    ons.append(0x90 == kind and velocity > 0)
+                i += 2
+        first = False
+    events = np.empty(len(ticks), dtype=NOTE_EVENT_DTYPE)
+    events['tick'] = np.frombuffer(ticks, dtype=np.int64)
+    events['pitch'] = np.frombuffer(pitches, dtype=np.uint8)
+    events['velocity'] = np.frombuffer(velocities, dtype=np.uint8)
+    events['on'] = ons
+    return name, events
+
+
+def read_ticks_per_beat(midi_fp: Union[str, Path]) -> int:
+    '''
+    只读取文件头中的 ticks_per_beat
+    '''
+    with open(midi_fp, 'rb') as f:
+        header = f.read(14)
+    if b'MThd' != header[:4] or len(header) < 14:
+        raise ValueError(f'{midi_fp} 不是标准Midi文件')
+    tpb = int.from_bytes(header[12:14], 'big')
+    if tpb & 0x8000:
+        raise ValueError(f'不支持SMPTE时间格式的Midi文件 {midi_fp}')
+    return tpb
+
+
+def read_smf(
+        midi_fp: Union[str, Path]
+    ) -> tuple[int, list[tuple[Union[str, None], np.ndarray]], np.ndarray,
+               np.ndarray]:
+    '''
+    读取标准Midi文件中各轨道的音符事件，以及全部的速度与拍号事件
+
+    Return
+    ---
+    (ticks_per_beat, [(轨道名称, 音符事件), ...], 速度事件, 拍号事件)
+    速度事件为 [n,2] 的数组 (tick, 每个四分音符的微秒数)，
+    拍号事件为 [n,3] 的数组 (tick, 分子, 分母)，均按tick排序
+    '''
+    with open(midi_fp, 'rb') as f:
+        data = f.read()
+    tpb, tracks = None, []
+    tempos, time_signatures = [], []
+    i = 0
+    while i + 8 <= len(data):
+        chunk_type = data[i:i + 4]
+        length = int.from_bytes(data[i + 4:i + 8], 'big')
+        body = data[i + 8:i + 8 + length]
+        i += 8 + length
+        if b'MThd' == chunk_type:
+            tpb = int.from_bytes(body[4:6], 'big')
+            if tpb & 0x8000:
+                raise ValueError(f'不支持SMPTE时间格式的Midi文件 {midi_fp}')
+        elif b'MTrk' == chunk_type:
+            tracks.append(scan_track(body, tempos, time_signatures))
+    if None is tpb:
+        raise ValueError(f'{midi_fp} 不是标准Midi文件')
+    # 各轨道的事件合并后按tick稳定排序，同一tick上保持轨道顺序
+    tempos.sort(key=lambda e: e[0])
+    time_signatures.sort(key=lambda e: e[0])
+    return (
+        tpb,
+        tracks,
+        np.array(tempos, dtype=np.int64).reshape(-1, 2),
+        np.array(time_signatures, dtype=np.int64).reshape(-1, 3),
+        )
+
+
+def pair_notes(events: np.ndarray) -> np.ndarray:
+    '''
+    将音符开始与结束事件配对（向量化）
+
+    同一音高的音符按先开始先结束配对，重叠的同音高音符都会保留；
+    没有对应开始的结束事件、直到轨道结束都没有结束的音符会被忽略
+
+    Parameters
+    ---
+    events:
+        - `NOTE_EVENT_DTYPE` 的音符事件
+
+    Return
+    ---
+    形如 [n,5] 的int64数组，各列依次为 音高, 力度, 开始时间, 结束时间, 持续长度（tick）
+    按结束事件在文件中的顺序排列
+    '''
+    n = len(events)
+    if 0 == n:
+        return np.empty((0, 5), dtype=np.int64)
+    # 按音高分组，组内保持事件的先后顺序
+    order = np.argsort(events['pitch'], kind='stable')
+    pitch = events['pitch'][order]
+    on = events['on'][order]
+    group_start = np.r_[True, pitch[1:] != pitch[:-1]]
+    group = np.cumsum(group_start) - 1
+    first = np.flatnonzero(group_start)[group]  # 每个事件所在组的第一个事件
+    # 组内的未结束音符数：开始+1，结束-1
+    step = np.where(on, 1, -1)
+    total = np.cumsum(step)
+    balance = total - (total - step)[first]
+    # 组内的历史最低值（起点为0）。各组错开一个足够大的偏移量，
+    # 使整体的 minimum.accumulate 不会跨组
+    offset = group * (2*n + 2)
+    low = np.minimum(np.minimum.accumulate(balance - offset) + offset, 0)
+    prev_low = np.r_[0, low[:-1]]
+    prev_low[group_start] = 0
+    # 使余额创新低的结束事件没有可以配对的音符
+    off = ~on & (low == prev_low)
+    # 组内第k个有效的结束事件与第k个开始事件配对，多余的开始事件直到结尾都未结束
+    n_on = np.cumsum(on)
+    on_rank = n_on - n_on[first] + on[first]
+    n_off = np.bincount(group, weights=off).astype(np.int64)
+    on = on & (on_rank <= n_off[group])
+    i_on, i_off = order[on], order[off]
+    # 按结束事件的顺序输出
+    sort = np.argsort(i_off, kind='stable')
+    i_on, i_off = i_on[sort], i_off[sort]
+    start, end = events['tick'][i_on], events['tick'][i_off]
+    return np.stack([
+        events['pitch'][i_on].astype(np.int64),
+        events['velocity'][i_on].astype(np.int64),
+        start,
+        end,
+        end - start,
+        ], axis=1)
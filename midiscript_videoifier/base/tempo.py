@@ -0,0 +1,203 @@
+import numpy as np
+from typing import Union
+
+from ..configs.default import CONFIG
+
+ArrayLike = Union[float, np.ndarray]
+
+
+class TempoMap():
+    '''
+    分段的速度表，由Midi文件中全部的速度（set_tempo）与拍号（time_signature）事件建立
+
+    以tick为中介，分别记录每个变化点的累计秒数与累计小节数。
+    小节时间、音乐时间与视频时间之间的换算都是分段线性函数，
+    用 `np.searchsorted` 找到所在的段，每次查找为 O(log k)，并且可以直接换算整个数组
+
+    时间的约定与 `MidiVisualizer` 一致：
+    tick 0 对应小节时间 `InitBar` 、音乐时间0秒、视频时间 `BeginTime`
+    '''
+
+    def __init__(
+            self,
+            tpb: int,
+            tempos: np.ndarray = None,
+            time_signatures: np.ndarray = None,
+            bpM: float = None,
+            spb: int = None,
+            bpB: int = None,
+            InitBar: float = None,
+            BeginTime: float = None,
+        ) -> None:
+        '''
+        Parameters
+        ---
+        tpb:
+            - ticks per beat（四分音符）
+        tempos:
+            - 形如 [n,2] 的速度事件：tick, 每个四分音符的微秒数
+        time_signatures:
+            - 形如 [n,3] 的拍号事件：tick, 分子, 分母
+        bpM, spb, bpB:
+            - 文件中第一个事件之前使用的速度与每小节拍数，默认取自设置
+        '''
+        self.tpb = tpb
+        self.spb = spb or CONFIG.spb
+        self.bpB = bpB or CONFIG.bpB
+        self.bpM = bpM or CONFIG.bpM
+        self.InitBar = CONFIG.InitBar if None is InitBar else InitBar
+        self.BeginTime = CONFIG.BeginTime if None is BeginTime else BeginTime
+        beat = self.beat = self.tpb // 4 * self.spb  # 每拍的tick数
+        # 速度：每段的起点tick与每tick的秒数
+        self.tempo_ticks, sec_per_tick = self._segments(
+            60 / (self.bpM*beat),
+            [(tick, us / 1e6 / tpb) for tick, us in _rows(tempos, 2)],
+            )
+        self.sec_per_tick = sec_per_tick
+        self.tempo_secs = np.r_[
+            0., np.cumsum(np.diff(self.tempo_ticks) * sec_per_tick[:-1])
+            ]
+        # 拍号：每段的起点tick与每小节的tick数
+        self.bar_ticks, ticks_per_bar = self._segments(
+            beat * self.bpB,
+            [
+                (tick, num * tpb * 4 / den)
+                for tick, num, den in _rows(time_signatures, 3)
+                ],
+            )
+        self.ticks_per_bar = ticks_per_bar
+        self.bar_bars = self.InitBar + np.r_[
+            0., np.cumsum(np.diff(self.bar_ticks) / ticks_per_bar[:-1])
+            ]
+        self.bar_beats = ticks_per_bar / beat
+
+    @staticmethod
+    def _segments(
+            default: float,
+            changes: list[tuple[int, float]]
+        ) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        由按tick排序的变化事件生成各段的 (起点tick, 斜率)
+        同一tick上有多个事件时以最后一个为准
+        '''
+        ticks, values = [0], [default]
+        for tick, value in changes:
+            if tick == ticks[-1]:
+                values[-1] = value
+            elif value != values[-1]:
+                ticks.append(tick)
+                values.append(value)
+        return np.array(ticks, dtype=np.float64), np.array(values)
+
+    @staticmethod
+    def _piecewise(
+            x: ArrayLike,
+            xp: np.ndarray,
+            yp: np.ndarray,
+            slope: np.ndarray
+        ) -> ArrayLike:
+        '''
+        分段线性函数，第一段之前按第一段的斜率外推
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        i = np.maximum(np.searchsorted(xp, x, 'right') - 1, 0)
+        y = yp[i] + (x - xp[i]) * slope[i]
+        return y if y.ndim else float(y)
+
+    def tick2sec(self, tick: ArrayLike) -> ArrayLike:
+        return self._piecewise(
+            tick, self.tempo_ticks, self.tempo_secs, self.sec_per_tick
+            )
+
+    def sec2tick(self, sec: ArrayLike) -> ArrayLike:
+        return self._piecewise(
+            sec, self.tempo_secs, self.tempo_ticks, 1 / self.sec_per_tick
+            )
+
+    def tick2bar(self, tick: ArrayLike) -> ArrayLike:
+        return self._piecewise(
+            tick, self.bar_ticks, self.bar_bars, 1 / self.ticks_per_bar
+            )
+
+    def bar2tick(self, tBar: ArrayLike) -> ArrayLike:
+        return self._piecewise(
+            tBar, self.bar_bars, self.bar_ticks, self.ticks_per_bar
+            )
+
+    def beats_per_bar(self, tBar: ArrayLike) -> ArrayLike:
+        '''
+        Bar时间所在小节的拍数，由拍号换算（6/8拍为3拍），第一个拍号之前为 `bpB`
+        '''
+        i = np.searchsorted(self.bar_bars, tBar, 'right') - 1
+        beats = self.bar_beats[np.maximum(i, 0)]
+        return beats if np.ndim(beats) else float(beats)
+
+    def beat_grid(self, tBar0: float, tBar1: float) -> np.ndarray:
+        '''
+        Bar时间 [tBar0, tBar1) 内的拍线位置
+
+        每个拍号段从其起点开始按该段的拍长划分，
+        第一个拍号之前按第一段向前外推
+        '''
+        bounds = np.r_[self.bar_bars[1:], np.inf]
+        grid = []
+        for i, (start, end, beats) in enumerate(
+                zip(self.bar_bars, bounds, self.bar_beats)
+            ):
+            lo = tBar0 if 0 == i else max(tBar0, start)
+            hi = min(tBar1, end)
+            if lo >= hi:
+                continue
+            # 舍入后取整，避免恰好落在拍线上的端点因浮点误差多取或少取一拍
+            k0, k1 = np.ceil(np.round((np.array([lo, hi]) - start) * beats, 9))
+            grid.append(start + np.arange(k0, k1) / beats)
+        return np.concatenate(grid) if grid else np.empty(0)
+
+    def timeBar2Trk(self, tBar: ArrayLike) -> ArrayLike:
+        '''
+        从Bar时间换算到音乐时间
+        '''
+        return self.tick2sec(self.bar2tick(tBar))
+
+    def timeTrk2Bar(self, tTrk: ArrayLike) -> ArrayLike:
+        '''
+        从音乐时间换算到Bar时间
+        '''
+        return self.tick2bar(self.sec2tick(tTrk))
+
+    def timeBar2Mov(self, tBar: ArrayLike) -> ArrayLike:
+        '''
+        从Bar时间换算到视频时间
+        '''
+        return self.timeBar2Trk(tBar) + self.BeginTime
+
+    def timeMov2Bar(self, tMov: ArrayLike) -> ArrayLike:
+        '''
+        从视频时间换算到Bar时间
+        '''
+        return self.timeTrk2Bar(np.subtract(tMov, self.BeginTime))
+
+    def spanBar2True(
+            self,
+            span_tBar: ArrayLike,
+            start_tBar: ArrayLike = None
+        ) -> ArrayLike:
+        '''
+        从start_tBar开始、长度为span_tBar的小节时间所对应的秒数
+        速度有变化时时长与起点有关，start_tBar默认为 `InitBar`
+        '''
+        if None is start_tBar:
+            start_tBar = self.InitBar
+        return self.span(start_tBar, np.add(start_tBar, span_tBar))
+
+    def span(self, tBar0: ArrayLike, tBar1: ArrayLike) -> ArrayLike:
+        '''
+        Bar时间 [tBar0, tBar1] 的实际时长（秒）
+        '''
+        return self.timeBar2Trk(tBar1) - self.timeBar2Trk(tBar0)
+
+
+def _rows(events: np.ndarray, n_cols: int) -> list[tuple]:
+    if None is events or 0 == len(events):
+        return []
+    return [tuple(row) for row in np.asarray(events).reshape(-1, n_cols)]
@@ -0,0 +1,145 @@
+import numpy as np
+import moviepy as me
+from moviepy import ImageClip
+from ..utils import DiskCache, make_key, file_digest
+
+
+def premultiply(rgb: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    '''
+    将moviepy的RGB画面与浮点遮罩合并为预乘透明度的 uint8 RGBA
+    '''
+    alpha = np.round(mask * 255).astype(np.uint16)
+    rgba = np.empty((*alpha.shape, 4), dtype=np.uint8)
+    rgba[..., :3] = (rgb.astype(np.uint16) * alpha[..., None] + 127) // 255
+    rgba[..., 3] = alpha
+    return rgba
+
+
+def unpremultiply(rgba: np.ndarray) -> np.ndarray:
+    '''
+    预乘透明度的RGBA还原为普通RGBA（完全透明处RGB为0）
+    '''
+    alpha = rgba[..., 3:].astype(np.uint32)
+    rgb = (rgba[..., :3].astype(np.uint32) * 255 + alpha // 2) // np.maximum(
+        alpha, 1
+        )
+    out = rgba.copy()
+    out[..., :3] = np.minimum(rgb, 255)
+    return out
+
+
+class TextRasterClip(ImageClip):
+    '''
+    由缓存的文字栅格生成的静态片段，画面与遮罩与同参数的 `TextClip` 一致
+
+    Properties
+    ---
+    premultiplied:
+        - 预乘透明度的 uint8 RGBA 栅格，合成时可以直接使用
+    '''
+
+    def __init__(self, premultiplied: np.ndarray, duration: float = None):
+        super().__init__(unpremultiply(premultiplied), duration=duration)
+        self.premultiplied = premultiplied
+
+
+class TextRasterCache():
+    '''
+    文字栅格缓存
+
+    以 (文本, 字体文件哈希, 字号, 颜色, 对齐方式, 行距) 为键，
+    缓存 `TextClip` 栅格化后的预乘RGBA数组。
+    同一次运行内命中内存，跨运行命中磁盘缓存
+    '''
+    VERSION = 1  # 栅格化方式有变化时递增
+
+    def __init__(self, disk: DiskCache = None) -> None:
+        '''
+        Parameters
+        ---
+        disk:
+            - 磁盘缓存，为空时只在内存中缓存
+        '''
+        self.disk = disk
+        self._memory: dict[str, np.ndarray] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.
+
+    def summary(self) -> str:
+        return (
+            f'text cache: {self.memory_hits} memory hit, '
+            f'{self.disk_hits} disk hit, {self.misses} miss '
+            f'(hit rate {self.hit_rate:.0%})'
+            )
+
+    def key(
+            self,
+            text: str,
+            font: str,
+            font_size: float,
+            color: str,
+            text_align: str,
+            interline: float
+        ) -> str:
+        return make_key(
+            type(self).__name__,
+            self.VERSION,
+            me.__version__,
+            text,
+            file_digest(font),
+            font_size,
+            color,
+            text_align,
+            interline,
+            )
+
+    def get(
+            self,
+            text: str,
+            font: str,
+            font_size: float,
+            color: str = 'black',
+            text_align: str = 'left',
+            interline: float = 4
+        ) -> np.ndarray:
+        '''
+        返回文字的预乘RGBA栅格，参数含义与 `TextClip` 相同
+
+        !Warning 返回的数组在多个片段间共享，不要原地修改
+        '''
+        key = self.key(text, font, font_size, color, text_align, interline)
+        rgba = self._memory.get(key)
+        if None is not rgba:
+            self.memory_hits += 1
+            return rgba
+        if None is not self.disk:
+            rgba = self.disk.load(key, mmap_mode=None)
+        if None is not rgba:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            tc = me.TextClip(
+                text=text,
+                font=font,
+                font_size=font_size,
+                color=color,
+                text_align=text_align,
+                interline=interline,
+                )
+            rgba = premultiply(tc.get_frame(0), tc.mask.get_frame(0))
+            if None is not self.disk:
+                self.disk.save(key, rgba)
+        self._memory[key] = rgba
+        return rgba
+
+    def clip(self, **kwds) -> TextRasterClip:
+        '''
+        `TextClip` 的替代，参数与 `get` 相同
+        '''
+        return TextRasterClip(self.get(**kwds))
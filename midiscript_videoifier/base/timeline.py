@@ -0,0 +1,190 @@
+import numpy as np
+from bisect import bisect_right
+from moviepy.Clip import Clip
+
+
+def is_static_clip(clip: Clip) -> bool:
+    '''
+    片段的画面与位置是否不随时间变化  
+    由片段的创建者通过 `mark_static` 声明，未声明的一律视为动态
+    '''
+    return getattr(clip, 'is_static', False)
+
+
+def has_fixed_position(clip: Clip) -> bool:
+    '''
+    片段的位置是否不随时间变化（画面可以变化）  
+    静态片段的位置必然固定
+    '''
+    return is_static_clip(clip) or getattr(clip, 'is_fixed_position', False)
+
+
+def mark_fixed_position(clip: Clip) -> Clip:
+    '''
+    声明片段的位置不随时间变化，合成时只计算一次像素偏移  
+    !Warning 与 `mark_static` 相同，需在最后一次 `with_*` 之后调用
+    '''
+    clip.is_fixed_position = True
+    return clip
+
+
+def mark_static(clip: Clip) -> Clip:
+    '''
+    声明片段为静态片段（画面、遮罩和位置都不随时间变化）  
+    !Warning 需在最后一次 `with_*` 之后调用，或确认之后的操作不会引入动态
+    '''
+    clip.is_static = True
+    return clip
+
+
+def frame_count(duration: float, fps: float) -> int:
+    '''
+    时长为duration的视频共有几帧：第n帧的时间为 n/fps ，取所有 n/fps < duration 的帧，
+    先舍入到 1e-6 帧以消除浮点误差（与 `FrameSchedule.first_frame` 一致）
+    '''
+    return int(np.ceil(round(duration * fps, 6)))
+
+
+class ClipTimeline():
+    '''
+    按时间索引的片段调度表
+
+    以所有片段的起止时间为边界将时间轴切分为若干区间，
+    并预先记录每个区间内正在播放的片段。
+    查询时二分定位区间，复杂度 O(log n + k)
+    '''
+
+    def __init__(self, clips: list[Clip]) -> None:
+        '''
+        Parameters
+        ---
+        clips:
+            - 已按图层顺序排好的片段，区间内的片段会保持该顺序
+        '''
+        self.clips = clips
+        bounds = [self.clip_bounds(clip) for clip in clips]
+        edges = set()
+        for start, end in bounds:
+            edges.add(start)
+            if end is not None:
+                edges.add(end)
+        self.edges: list[float] = sorted(edges)
+        # 第i个区间为 [edges[i], edges[i+1])，最后一个区间延伸到无穷
+        segments: list[list[Clip]] = [[] for _ in self.edges]
+        for clip, (start, end) in zip(clips, bounds):
+            i_start = bisect_right(self.edges, start) - 1
+            if end is None:
+                i_end = len(self.edges)
+            else:
+                i_end = bisect_right(self.edges, end) - 1
+            for i in range(i_start, i_end):
+                segments[i].append(clip)
+        self.segments: list[tuple[Clip]] = [tuple(s) for s in segments]
+        # 每个区间最底部连续的静态片段数量，这部分可以预先合成为底图
+        self.static_counts: list[int] = []
+        for segment in self.segments:
+            n = 0
+            while n < len(segment) and is_static_clip(segment[n]):
+                n += 1
+            self.static_counts.append(n)
+
+    def clip_bounds(self, clip: Clip) -> tuple[float, float]:
+        '''
+        片段在时间轴上的起止位置，end为None表示没有终点
+        '''
+        return clip.start, clip.end
+
+    def snap(self, t: float) -> float:
+        '''
+        合成时实际使用的时间，这里即t本身
+        '''
+        return t
+
+    def segment_index(self, t: float) -> int:
+        '''
+        返回时间t所在区间的序号，早于所有片段时返回 -1
+        '''
+        return bisect_right(self.edges, t) - 1
+
+    def segment_range(self, i: int) -> tuple[float, float]:
+        '''
+        返回第i个区间的起止时间
+        '''
+        if i + 1 < len(self.edges):
+            return self.edges[i], self.edges[i + 1]
+        return self.edges[i], float('inf')
+
+    def playing(self, t: float) -> tuple[Clip]:
+        '''
+        返回时间t正在播放的片段，与 `Clip.is_playing` 的判定一致：
+        start <= t < end
+        '''
+        i = self.segment_index(t)
+        if i < 0:
+            return ()
+        return self.segments[i]
+
+
+class FrameSchedule(ClipTimeline):
+    '''
+    按输出帧率编译的片段调度表
+
+    第n帧对应的时间为 `t0 + n/fps` ，片段在 start <= t < end 的帧上播放。
+    编译时把每个片段的起止时间换算为整数帧区间，
+    查询时先把时间舍入到帧序号，再在整数边界上二分定位区间。
+    同一帧无论从哪一段开始渲染（`t0 + a/fps + i/fps` 的浮点误差不同），
+    得到的片段集合与片段内时间都完全一致，分段并行渲染的接缝处逐位相同
+    '''
+
+    def __init__(
+            self,
+            clips: list[Clip],
+            fps: float,
+            t0: float = 0.
+        ) -> None:
+        '''
+        Parameters
+        ---
+        clips:
+            - 已按图层顺序排好的片段
+        fps:
+            - 输出帧率
+        t0:
+            - 第0帧对应的时间，即输出视频裁剪范围的起点
+        '''
+        self.fps = fps
+        self.t0 = t0
+        super().__init__(clips)
+        self.frames = np.array(self.edges, dtype=np.int64)
+
+    def frame_index(self, t: float) -> int:
+        '''
+        时间t所在的帧序号
+        '''
+        return round((t - self.t0) * self.fps)
+
+    def frame_time(self, n: int) -> float:
+        '''
+        第n帧的时间
+        '''
+        return self.t0 + n / self.fps
+
+    def first_frame(self, t: float) -> int:
+        '''
+        不早于时间t的第一帧，先舍入到 1e-6 帧以消除浮点误差
+        '''
+        return frame_count(t - self.t0, self.fps)
+
+    def clip_bounds(self, clip: Clip) -> tuple[int, int]:
+        end = None if clip.end is None else self.first_frame(clip.end)
+        return self.first_frame(clip.start), end
+
+    def snap(self, t: float) -> float:
+        '''
+        舍入到所在帧的时间
+        '''
+        return self.frame_time(self.frame_index(t))
+
+    def segment_index(self, t: float) -> int:
+        n = self.frame_index(t)
+        return int(np.searchsorted(self.frames, n, 'right')) - 1
@@ -2,7 +2,7 @@ from typing import Union, Literal
 from dataclasses import dataclass
 import numpy as np
 from melody_machine.visualizer.base_types import ColorPalette
-import matplotlib.pyplot as plt
+import matplotlib as mpl
 
 
 @dataclass
@@ -26,6 +26,20 @@ class CONFIG():
     min_pitch_range = [10, 10]  # 音高上下最小范围
     subclip_tBar = None  # 输出视频的裁剪范围（小节）
     subclip_tMov = None  # 输出视频的裁剪范围（秒）
+    midi_render_mode = 'clip'  # Midi段落的渲染方式：'clip' 逐帧绘制；'raster' 静态底图+时间线；'blit' matplotlib局部重绘时间线
+    pianoroll_backend = 'matplotlib'  # raster方式下底图的绘制后端：'matplotlib' 或 'numpy'
+    prerender_workers = None  # raster方式下预绘制底图的并行数，默认为CPU核心数
+    prerender_executor = 'process'  # 预绘制底图的并行方式：'process' 进程池；'thread' 线程池（内存占用更小）
+    cache_dir = None  # 缓存目录，默认为 ~/.cache/midiscript_videoifier
+    raster_cache_size = 2048  # Midi底图磁盘缓存的容量上限（MB），0为不使用缓存
+    text_cache_size = 256  # 文字栅格磁盘缓存的容量上限（MB），0为只在内存中缓存
+    midi_cache_size = 256  # Midi解析结果的磁盘缓存容量上限（MB），0为不使用缓存
+    segment_cache_size = 8192  # 增量渲染时已编码分段的缓存容量上限（MB）
+    draft = False  # 草稿模式：画面按 draft_scale 等比缩小，用于快速预览
+    draft_scale = 0.5  # 草稿模式下画面尺寸的缩放系数
+    draft_fps = 24  # 草稿模式下的帧率
+    encoder_profile = 'final'  # 编码档位：'draft' 、'review' 或 'final'
+    encoder_target_psnr = None  # 设置后试编码各档位，选择达到该画质（dB）的最快档位
     spB = spb * bpB
     BpM = bpM / bpB
     step = tpb // 4  # Fl studio中可视的最小单位长度 24
@@ -53,7 +67,7 @@ class COLOR():
     # COLOR_NOTES_FACE = ['#9ed1a5', '#9fd3ba', '#a1d6d0', '#a3cad8']
     # COLOR_NOTES_FACE = [plt.get_cmap('tab20')(x) for x in range(20)]
     COLOR_NOTES_FACE = ColorPalette([
-        plt.get_cmap('tab20')(x) for x in [5, 1, 3, 9, 17, 15]
+        mpl.colormaps['tab20'](x) for x in [5, 1, 3, 9, 17, 15]
         ])
     # COLOR_NOTES_FACE = [plt.get_cmap('tab20')(x) for x in [4, 0, 2, 8, 16, 14]]
     COLOR_NOTE_EDGE = np.array([*COLOR_BG, 0.9])
@@ -61,3 +75,31 @@ class COLOR():
     COLOR_GRID_MAJOR = np.array([0.8, 0.8, 0.8])
     COLOR_GRID_MINOR = np.array([0.6, 0.6, 0.6])
     COLOR_TIME_LINE = np.array([0.1, 0.5, 0.7])
+
+
+# matplotlib的绘图样式，各绘制器按实例使用，不修改全局的 rcParams
+PLOT_STYLE = {
+    'font.family': 'Sarasa Mono SC',
+    'font.size': 10.5,  # 10.5pt 五号字；9pt 小五号字
+    'mathtext.fontset': 'stix',
+    'figure.subplot.left': 0.11,  #0.05
+    'figure.subplot.right': 0.89,  #0.98
+    'figure.subplot.bottom': 0.15,  #0.1
+    'figure.subplot.top': 0.91,  #0.93
+    'figure.facecolor': (1, 1, 1, 0),
+    'figure.dpi': 300,
+    'axes.facecolor': (1, 1, 1, 0),
+    'axes.titlesize': 'medium',
+    'legend.fontsize': 'medium',
+    'interactive': False,
+    }
+
+
+def apply_plot_style(style: dict = None):
+    '''
+    将绘图样式写入matplotlib全局的 rcParams
+
+    只有仍通过pyplot绘制的 `clip` 方式（melody_machine）需要，
+    修改全局状态时不应有其他线程在绘制
+    '''
+    mpl.rcParams.update(style or PLOT_STYLE)
@@ -0,0 +1,19 @@
+from .ffmpeg import (
+    run_ffmpeg,
+    concat_videos,
+    mux_audio,
+    probe_audio_codec,
+    resolve_audio_codec,
+    )
+from .parallel import render_parallel
+from .incremental import render_incremental
+from .writer import FFmpegPipeWriter, write_videofile
+from .yuv import YUV420Converter
+from .encoder import (
+    EncoderProfile,
+    PROFILES,
+    available_encoders,
+    probe_encoder,
+    select_profile,
+    calibrate_profile,
+    )
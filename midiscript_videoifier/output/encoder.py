@@ -0,0 +1,187 @@
+import subprocess
+import numpy as np
+from pathlib import Path
+from functools import lru_cache
+from dataclasses import dataclass, asdict
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from moviepy import VideoClip
+from moviepy.config import FFMPEG_BINARY
+from .writer import FFmpegPipeWriter
+
+
+@dataclass
+class EncoderProfile():
+    '''
+    一组编码参数，字段与 `FFmpegPipeWriter` 的同名参数对应
+    '''
+    name: str
+    codec: str
+    preset: str = None
+    crf: float = None
+    bitrate: str = None
+    threads: int = None
+
+    def writer_kwds(self) -> dict:
+        kwds = asdict(self)
+        kwds.pop('name')
+        return kwds
+
+
+# 每个档位按优先顺序列出候选，选择第一个本机可用的编码器
+PROFILES: dict[str, list[EncoderProfile]] = {
+    'draft': [
+        EncoderProfile('draft', 'h264_nvenc', preset='p1', bitrate='4000k'),
+        EncoderProfile('draft', 'libx264', preset='ultrafast', crf=28),
+        ],
+    'review': [
+        EncoderProfile('review', 'h264_nvenc', preset='p4', bitrate='8000k'),
+        EncoderProfile('review', 'libx264', preset='veryfast', crf=23),
+        ],
+    'final': [
+        EncoderProfile(
+            'final', 'h264_nvenc', preset='p7', bitrate='12000k', threads=6
+            ),
+        EncoderProfile('final', 'libx264', preset='slow', crf=18),
+        ],
+    }
+
+
+@lru_cache(maxsize=None)
+def available_encoders() -> frozenset[str]:
+    '''
+    本机ffmpeg编译时包含的视频编码器
+    '''
+    out = subprocess.run(
+        [FFMPEG_BINARY, '-hide_banner', '-encoders'],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        ).stdout
+    encoders = set()
+    for line in out.splitlines():
+        parts = line.split()
+        # 形如 ` V....D libx264   libx264 H.264 ...`
+        if len(parts) >= 2 and parts[0].startswith('V') and len(parts[0]) == 6:
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+
+@lru_cache(maxsize=None)
+def probe_encoder(codec: str) -> bool:
+    '''
+    编码器是否真正可用
+    h264_nvenc 等硬件编码器即使编译进了ffmpeg，没有对应的显卡时也会失败，
+    因此用一帧很小的画面试编码一次
+    '''
+    if codec not in available_encoders():
+        return False
+    proc = subprocess.run(
+        [
+            FFMPEG_BINARY, '-hide_banner', '-nostdin', '-v', 'error',
+            '-f', 'lavfi', '-i', 'color=c=black:s=256x256:d=0.1',
+            '-frames:v', '1', '-c:v', codec, '-f', 'null', '-'
+            ],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        )
+    return proc.returncode == 0
+
+
+def select_profile(name: str) -> EncoderProfile:
+    '''
+    按档位名称选择本机可用的编码参数
+    '''
+    if name not in PROFILES:
+        raise ValueError(f'未知的编码档位 {name}，可选 {list(PROFILES)}')
+    for profile in PROFILES[name]:
+        if probe_encoder(profile.codec):
+            return profile
+    raise RuntimeError(f'编码档位 {name} 的候选编码器均不可用')
+
+
+def sample_frames(clip: VideoClip, n_frames: int = 20) -> list[np.ndarray]:
+    '''
+    在片段中均匀抽取若干帧
+    '''
+    times = (np.arange(n_frames) + 0.5) / n_frames * clip.duration
+    return [clip.get_frame(t)[:, :, :3].astype(np.uint8) for t in times]
+
+
+def decode_frames(fp: Path, size: tuple[int, int]) -> np.ndarray:
+    '''
+    将视频解码为 [n,h,w,3] 的RGB数组
+    '''
+    w, h = size
+    out = subprocess.run(
+        [
+            FFMPEG_BINARY, '-hide_banner', '-nostdin', '-v', 'error',
+            '-i', str(fp), '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'
+            ],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        ).stdout
+    return np.frombuffer(out, dtype=np.uint8).reshape(-1, h, w, 3)
+
+
+def psnr(ref: np.ndarray, test: np.ndarray) -> float:
+    mse = np.mean((ref.astype(np.float32) - test.astype(np.float32))**2)
+    return float('inf') if mse == 0 else float(10 * np.log10(255**2 / mse))
+
+
+def calibrate_profile(
+        clip: VideoClip,
+        target_psnr: float,
+        names: list[str] = None,
+        n_frames: int = 20,
+        fps: float = 60,
+    ) -> EncoderProfile:
+    '''
+    用视频中抽取的真实画面试编码各档位，选择满足目标画质的最快档位
+
+    Parameters
+    ---
+    target_psnr:
+        - 目标画质（RGB的PSNR，dB）
+    names:
+        - 参与比较的档位，默认为全部
+    n_frames:
+        - 抽取的帧数
+
+    Return
+    ---
+    满足目标画质且编码最快的档位；都不满足时返回画质最高的档位
+    '''
+    frames = sample_frames(clip, n_frames)
+    size = frames[0].shape[1::-1]
+    results: list[tuple[EncoderProfile, float, float]] = []
+    with TemporaryDirectory() as tmp_dir:
+        for name in names or list(PROFILES):
+            profile = select_profile(name)
+            fp = Path(tmp_dir) / f'{name}.mp4'
+            t0 = perf_counter()
+            with FFmpegPipeWriter(
+                    fp,
+                    size,
+                    fps,
+                    report_interval=0,
+                    **profile.writer_kwds(),
+                ) as writer:
+                for frame in frames:
+                    writer.write_frame(frame)
+            speed = len(frames) / (perf_counter() - t0)
+            decoded = decode_frames(fp, size)
+            quality = np.mean([psnr(a, b) for a, b in zip(frames, decoded)])
+            results.append((profile, speed, quality))
+            print(
+                f'calibrate {name:6} {profile.codec:10} '
+                f'{speed:6.1f} fps  PSNR {quality:.2f}dB'
+                )
+    passed = [r for r in results if r[2] >= target_psnr]
+    if passed:
+        profile = max(passed, key=lambda r: r[1])[0]
+    else:
+        print(f'Warning: 没有档位达到 {target_psnr}dB ，使用画质最高的档位')
+        profile = max(results, key=lambda r: r[2])[0]
+    print(f'selected encoder profile: {profile}\n')
+    return profile
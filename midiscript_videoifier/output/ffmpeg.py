@@ -0,0 +1,203 @@
+import re
+import subprocess
+from pathlib import Path
+from typing import Union
+from functools import lru_cache
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+
+def run_ffmpeg(args: list) -> None:
+    '''
+    调用ffmpeg执行命令，失败时抛出包含ffmpeg输出的RuntimeError
+
+    Parameters
+    ---
+    args:
+        - 除可执行文件外的命令行参数
+    '''
+    cmd = [FFMPEG_BINARY, '-hide_banner', '-nostdin', '-y', *map(str, args)]
+    proc = subprocess.run(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f'ffmpeg 执行失败: {" ".join(cmd)}\n'
+            f'{proc.stderr.decode(errors="ignore")}'
+            )
+
+
+# 各容器可以直接复制（不重新编码）的音频编码，None表示不限
+COPYABLE_AUDIO_CODECS = {
+    '.mp4': {'aac', 'mp3', 'alac', 'opus', 'flac', 'ac3'},
+    '.m4v': {'aac', 'mp3', 'alac', 'ac3'},
+    '.mov': {'aac', 'mp3', 'alac', 'pcm_s16le', 'pcm_s24le'},
+    '.mkv': None,
+    }
+
+
+@lru_cache(maxsize=None)
+def probe_audio_codec(audio_fp: Union[str, Path]) -> Union[str, None]:
+    '''
+    文件中第一条音频流的编码名称，如 `aac` 、`pcm_s16le` ，没有音频时返回None
+    '''
+    proc = subprocess.run(
+        [FFMPEG_BINARY, '-hide_banner', '-nostdin', '-i', str(audio_fp)],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        )
+    match = re.search(
+        r'Stream #\d+:\d+.*?: Audio: (\w+)',
+        proc.stderr.decode(errors='ignore')
+        )
+    return match.group(1) if match else None
+
+
+def resolve_audio_codec(
+        audio_fp: Union[str, Path],
+        output_fp: Union[str, Path],
+        audio_codec: str = 'auto'
+    ) -> str:
+    '''
+    确定混入音频时使用的编码器
+
+    Parameters
+    ---
+    audio_codec:
+        - `auto` 时若输出容器支持原音频的编码则直接复制，否则编码为aac；
+        其他值原样返回
+
+    Return
+    ---
+    `copy` 或编码器名称
+    '''
+    if 'auto' != audio_codec:
+        return audio_codec
+    suffix = Path(output_fp).suffix.lower()
+    if suffix not in COPYABLE_AUDIO_CODECS:
+        return 'aac'
+    allowed = COPYABLE_AUDIO_CODECS[suffix]
+    codec = probe_audio_codec(str(audio_fp))
+    if None is allowed or codec in allowed:
+        return 'copy'
+    return 'aac'
+
+
+def audio_codec_args(audio_codec: str, audio_bitrate: str) -> list[str]:
+    if 'copy' == audio_codec:
+        return ['-c:a', 'copy']
+    return ['-c:a', audio_codec, '-b:a', audio_bitrate]
+
+
+def audio_offset_args(
+        offset: float,
+        duration: float = None,
+        copy: bool = False
+    ) -> tuple[list[str], list[str]]:
+    '''
+    音频在视频中起始时间对应的ffmpeg参数
+
+    `-itsoffset` 只修改时间戳，mp4中的起始空白会被部分播放器忽略，
+    因此正偏移用 `adelay` 补上真实的静音；负偏移在输入端跳过音频开头
+
+    Parameters
+    ---
+    offset:
+        - 音频在视频中的起始时间（秒）
+    duration:
+        - 视频时长。给出时用 `apad` 补齐音频并以 `-t` 截断，输出时长与视频严格一致；
+        否则使用 `-shortest`
+        （`apad` 与 `-shortest` 同时使用时ffmpeg 7不会结束，因此不能组合）
+    copy:
+        - 音频流直接复制时不能使用滤镜：正偏移改用 `-itsoffset` 平移时间戳
+        （mp4中写为编辑列表），音频较短时也不再补齐
+
+    Return
+    ---
+    (放在音频 `-i` 之前的参数, 输出端的音频参数)
+    '''
+    if copy:
+        seek = []
+        if offset > 0:
+            seek = ['-itsoffset', f'{offset:.6f}']
+        elif offset < 0:
+            seek = ['-ss', f'{-offset:.6f}']
+        limit = ['-shortest'] if None is duration else ['-t', f'{duration:.6f}']
+        return seek, limit
+    seek, filters = [], []
+    if offset > 0:
+        filters.append(f'adelay=delays={round(offset * 1000)}:all=1')
+    elif offset < 0:
+        seek = ['-ss', f'{-offset:.6f}']
+    if None is not duration:
+        filters.append('apad')
+        limit = ['-t', f'{duration:.6f}']
+    else:
+        limit = ['-shortest']
+    output = ['-af', ','.join(filters)] if filters else []
+    return seek, output + limit
+
+
+def concat_videos(
+        video_fps: list[Union[str, Path]],
+        output_fp: Union[str, Path]
+    ) -> Path:
+    '''
+    用concat分离器将编码参数相同的多段视频无损拼接（流复制，不重新编码）
+
+    Parameters
+    ---
+    video_fps:
+        - 按播放顺序排列的视频文件
+    output_fp:
+        - 输出文件
+    '''
+    output_fp = Path(output_fp)
+    list_fp = output_fp.with_name(output_fp.stem + '.concat.txt')
+    with open(list_fp, 'w', encoding='utf-8') as f:
+        for fp in video_fps:
+            fp = Path(fp).absolute().as_posix().replace("'", r"'\''")
+            f.write(f"file '{fp}'\n")
+    try:
+        run_ffmpeg([
+            '-f', 'concat', '-safe', '0', '-i', list_fp,
+            '-c', 'copy', output_fp
+            ])
+    finally:
+        list_fp.unlink(missing_ok=True)
+    return output_fp
+
+
+def mux_audio(
+        video_fp: Union[str, Path],
+        audio_fp: Union[str, Path],
+        output_fp: Union[str, Path],
+        offset: float = 0,
+        audio_codec: str = 'auto',
+        audio_bitrate: str = '192k'
+    ) -> Path:
+    '''
+    为视频添加音轨，视频流直接复制
+
+    Parameters
+    ---
+    offset:
+        - 音频在视频中的起始时间（秒）。为负数时从音频的 `-offset` 处开始
+    audio_codec:
+        - 音频编码器，`auto` 时容器允许则直接复制原音频，见 `resolve_audio_codec`
+    '''
+    duration = ffmpeg_parse_infos(str(video_fp))['duration']
+    audio_codec = resolve_audio_codec(audio_fp, output_fp, audio_codec)
+    seek, audio_output = audio_offset_args(
+        offset, duration, copy='copy' == audio_codec
+        )
+    run_ffmpeg([
+        '-i', video_fp, *seek, '-i', audio_fp,
+        '-map', '0:v:0', '-map', '1:a:0', *audio_output,
+        '-c:v', 'copy', *audio_codec_args(audio_codec, audio_bitrate),
+        output_fp
+        ])
+    return Path(output_fp)
@@ -0,0 +1,205 @@
+import shutil
+import numpy as np
+from pathlib import Path
+from typing import Union
+from tempfile import TemporaryDirectory
+from concurrent.futures import ProcessPoolExecutor
+from ..base.script import Script
+from ..base.movie import Movie
+from ..base.timeline import frame_count
+from ..base.pianoroll import PianoRollRenderer
+from ..base.rasterizer import NumpyPianoRollRenderer
+from ..base.text import TextRasterCache
+from ..utils import DiskCache, make_key, file_digest, DEFAULT_CACHE_DIR
+from ..configs.default import CONFIG, COLOR
+from .ffmpeg import concat_videos, mux_audio
+from .parallel import render_chunk, write_frame_range
+
+SEGMENT_VERSION = 2  # 分段方式或画面合成有变化时递增
+
+# 不影响画面的手稿参数，修改它们不应使已编码的分段失效
+SEGMENT_IGNORED_KEYS = {
+    'audio_fp', 'output_fp', 'prerender_workers', 'prerender_executor',
+    'cache_dir', 'raster_cache_size', 'text_cache_size', 'midi_cache_size',
+    'segment_cache_size', 'encoder_profile', 'encoder_target_psnr'
+    }
+
+
+def paragraph_segments(
+        mov: Movie,
+        script: Script,
+        n_frames: int,
+        fps: float
+    ) -> list[tuple[int, int]]:
+    '''
+    按文本段落的起始时间把输出视频的 [0, n_frames) 帧切分为若干段
+
+    Return
+    ---
+    [a, b) 帧区间的列表，第一段为片头（标题与倒计时）
+    '''
+    subclip_range = mov.get_subclip_range()
+    offset = subclip_range[0] if subclip_range else 0
+    starts = [p.range[0] for p in script.paragraphs if p.range[1] > p.range[0]]
+    cuts = set(
+        np.round((mov.tempo_map.timeBar2Mov(np.array(starts, dtype=float))
+                  - offset) * fps).astype(int).tolist()
+        )
+    bounds = [0, *sorted(c for c in cuts if 0 < c < n_frames), n_frames]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def segment_key(
+        mov: Movie,
+        script: Script,
+        frame_range: tuple[int, int],
+        fps: float,
+        write_kwds: dict,
+        movie_kwds: dict = None
+    ) -> str:
+    '''
+    分段的缓存键，涵盖影响该段画面的全部内容：
+    与该段重叠的文本段落与Midi段落、全局参数、配色、字体、Midi文件与绘制器版本
+    '''
+    subclip_range = mov.get_subclip_range()
+    offset = subclip_range[0] if subclip_range else 0
+    t0, t1 = frame_range[0] / fps + offset, frame_range[1] / fps + offset
+
+    def overlaps(bar_range):
+        return (
+            mov.tempo_map.timeBar2Mov(bar_range[0]) < t1
+            and mov.tempo_map.timeBar2Mov(bar_range[1]) > t0
+            )
+
+    paragraphs = [
+        (p.range, p.text)
+        for p in script.paragraphs
+        if p.range[1] > p.range[0] and overlaps(p.range)
+        ]
+    midi_patterns = [
+        (mp.range, mp.disp_range, mp.channels, mp.pitch_clip_range)
+        for mp in script.midi_patterns
+        if None is not mp.disp_range and overlaps(mp.disp_range)
+        ]
+    session_data = {
+        k: v
+        for k, v in script.session_data.items()
+        if k not in SEGMENT_IGNORED_KEYS
+        }
+    return make_key(
+        SEGMENT_VERSION,
+        PianoRollRenderer.VERSION,
+        NumpyPianoRollRenderer.VERSION,
+        TextRasterCache.VERSION,
+        session_data,
+        {k: v for k, v in vars(COLOR).items() if not k.startswith('__')},
+        file_digest(mov.FontPath),
+        file_digest(mov.midi_fp),
+        paragraphs,
+        midi_patterns,
+        frame_range,
+        fps,
+        (mov.w, mov.h),
+        write_kwds,
+        movie_kwds or {},
+        )
+
+
+def render_incremental(
+        script_fp: Union[str, Path],
+        output_fp: Union[str, Path],
+        fps: float = 60,
+        workers: int = 1,
+        movie_kwds: dict = None,
+        cache_dir: Union[str, Path] = None,
+        segment_cache_size: float = None,
+        audio_codec: str = 'auto',
+        audio_bitrate: str = '192k',
+        **write_kwds
+    ) -> Path:
+    '''
+    增量渲染：按文本段落把视频切分为若干段，每段按其内容的哈希缓存编码结果，
+    只重新渲染内容有变化的段，再用concat分离器无损拼接并混入音频
+
+    Parameters
+    ---
+    workers:
+        - 重新渲染分段的进程数，大于1时各进程独立按手稿重建视频
+    movie_kwds:
+        - 传给 `Movie.from_script` 的参数，覆盖手稿中的设置
+    cache_dir:
+        - 缓存目录，分段保存在其中的 `segments` 子目录
+    segment_cache_size:
+        - 分段缓存的容量上限（MB），超出时淘汰最久未使用的分段
+    write_kwds:
+        - 传给 `FFmpegPipeWriter` 的编码参数，同样计入缓存键
+    '''
+    script_fp = Path(script_fp).absolute()
+    output_fp = Path(output_fp)
+    script = Script(file_path=script_fp)
+    mov = Movie.from_script(script, **(movie_kwds or {}))
+    comp_vc = mov.generate_movie(fps=fps)
+    cache_dir = Path(
+        cache_dir or script.session_data.get('cache_dir') or DEFAULT_CACHE_DIR
+        )
+    if None is segment_cache_size:
+        segment_cache_size = script.session_data.get(
+            'segment_cache_size', CONFIG.segment_cache_size
+            )
+    cache = DiskCache(
+        cache_dir / 'segments',
+        max_bytes=int(segment_cache_size * 2**20),
+        suffix=output_fp.suffix,
+        )
+    segments = paragraph_segments(
+        mov, script, frame_count(comp_vc.duration, fps), fps
+        )
+    keys = [
+        segment_key(mov, script, frame_range, fps, write_kwds, movie_kwds)
+        for frame_range in segments
+        ]
+    segment_fps = [cache.lookup(key) for key in keys]
+    stale = [i for i, fp in enumerate(segment_fps) if None is fp]
+    print(
+        f'segment cache: {len(segments) - len(stale)}/{len(segments)} hit, '
+        f'rendering {sum(segments[i][1] - segments[i][0] for i in stale)} '
+        f'frames ({cache.root})'
+        )
+    with TemporaryDirectory(dir=output_fp.parent) as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        for i in stale:
+            segment_fps[i] = tmp_dir / f'segment_{i:04d}{output_fp.suffix}'
+        if workers > 1 and len(stale) > 1:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [
+                    pool.submit(
+                        render_chunk, script_fp, segment_fps[i], segments[i],
+                        fps, movie_kwds, **write_kwds
+                        )
+                    for i in stale
+                    ]
+                for future in futures:
+                    future.result()
+        else:
+            for i in stale:
+                write_frame_range(
+                    comp_vc, segment_fps[i], segments[i], fps, **write_kwds
+                    )
+        video_fp = concat_videos(
+            segment_fps, tmp_dir / f'video{output_fp.suffix}'
+            )
+        # 拼接完成后再存入缓存，避免淘汰本次还要用到的分段
+        for i in stale:
+            cache.store_file(keys[i], segment_fps[i])
+        if None is not mov.audio_fp:
+            mux_audio(
+                video_fp,
+                mov.audio_fp,
+                output_fp,
+                offset=mov.get_audio_offset(),
+                audio_codec=audio_codec,
+                audio_bitrate=audio_bitrate,
+                )
+        else:
+            shutil.move(video_fp, output_fp)
+    return output_fp
@@ -0,0 +1,143 @@
+import os
+import shutil
+import numpy as np
+from pathlib import Path
+from typing import Union
+from tempfile import TemporaryDirectory
+from concurrent.futures import ProcessPoolExecutor
+from moviepy import VideoClip
+from ..base.script import Script
+from ..base.movie import Movie
+from ..base.timeline import frame_count
+from .ffmpeg import concat_videos, mux_audio
+from .writer import write_videofile
+
+
+def split_frames(n_frames: int, n_chunks: int) -> list[tuple[int, int]]:
+    '''
+    将 [0, n_frames) 帧均匀切分为若干个 [a, b) 区间，边界对齐到整数帧
+    '''
+    n_chunks = max(1, min(n_chunks, n_frames))
+    bounds = np.linspace(0, n_frames, n_chunks + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def write_frame_range(
+        clip: VideoClip,
+        output_fp: Union[str, Path],
+        frame_range: tuple[int, int],
+        fps: float,
+        **write_kwds
+    ) -> Path:
+    '''
+    只编码片段中的 [a, b) 帧（不含音频），帧i对应的时间为 i/fps
+    '''
+    a, b = frame_range
+    clip = clip.subclipped(a / fps, min(b / fps, clip.duration))
+    # 末段的 b/fps 可能略超出视频末尾，补足时长使帧数恰为 b-a （见 `frame_count`）
+    clip = clip.with_duration((b-a) / fps)
+    return write_videofile(
+        clip, output_fp, fps=fps, report_interval=0, **write_kwds
+        )
+
+
+def render_chunk(
+        script_fp: Union[str, Path],
+        chunk_fp: Union[str, Path],
+        frame_range: tuple[int, int],
+        fps: float,
+        movie_kwds: dict = None,
+        **write_kwds
+    ) -> Path:
+    '''
+    在工作进程中按手稿重建视频，并只渲染 [a, b) 帧（不含音频）
+
+    Parameters
+    ---
+    frame_range:
+        - 输出视频中的帧序号范围，帧i对应的时间为 i/fps
+    movie_kwds:
+        - 传给 `Movie.from_script` 的参数，覆盖手稿中的设置
+    write_kwds:
+        - 传给 `FFmpegPipeWriter` 的编码参数
+    '''
+    # 各段已经并行，段内不再开启底图预绘制的进程池
+    mov = Movie.from_script(
+        Script(file_path=script_fp),
+        **{**(movie_kwds or {}), 'prerender_workers': 1}
+        )
+    return write_frame_range(
+        mov.generate_movie(fps=fps), chunk_fp, frame_range, fps, **write_kwds
+        )
+
+
+def render_parallel(
+        script_fp: Union[str, Path],
+        output_fp: Union[str, Path],
+        workers: int = None,
+        fps: float = 60,
+        n_chunks: int = None,
+        movie_kwds: dict = None,
+        audio_codec: str = 'auto',
+        audio_bitrate: str = '192k',
+        **write_kwds
+    ) -> Path:
+    '''
+    多进程分段渲染：将视频时间轴按帧切分为若干段，
+    每个工作进程独立按手稿重建视频并编码其中一段，
+    再用concat分离器无损拼接，最后统一混入音频
+
+    Parameters
+    ---
+    script_fp:
+        - 手稿路径，工作进程会重新读取
+    workers:
+        - 进程数，默认为CPU核心数
+    n_chunks:
+        - 切分的段数，默认与进程数相同
+    movie_kwds:
+        - 传给 `Movie.from_script` 的参数，覆盖手稿中的设置
+    write_kwds:
+        - 传给 `FFmpegPipeWriter` 的编码参数，各段必须一致才能直接拼接
+    '''
+    script_fp = Path(script_fp).absolute()
+    output_fp = Path(output_fp)
+    workers = workers or os.cpu_count()
+    script = Script(file_path=script_fp)
+    # 主进程只需要时长与音频的位置，不建立Song也不生成片段，画面全部由工作进程绘制
+    mov = Movie(**{**script.session_data, **(movie_kwds or {})})
+    chunks = split_frames(
+        frame_count(mov.script_duration(script), fps), n_chunks or workers
+        )
+    audio_offset = mov.get_audio_offset()
+    with TemporaryDirectory(dir=output_fp.parent) as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        chunk_fps = [
+            tmp_dir / f'chunk_{i:04d}{output_fp.suffix}'
+            for i in range(len(chunks))
+            ]
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [
+                pool.submit(
+                    render_chunk, script_fp, chunk_fp, frame_range, fps,
+                    movie_kwds, **write_kwds
+                    )
+                for chunk_fp, frame_range in zip(chunk_fps, chunks)
+                ]
+            for future in futures:
+                future.result()
+        video_fp = concat_videos(
+            chunk_fps, tmp_dir / f'video{output_fp.suffix}'
+            )
+        if None is not mov.audio_fp:
+            mux_audio(
+                video_fp,
+                mov.audio_fp,
+                output_fp,
+                offset=audio_offset,
+                audio_codec=audio_codec,
+                audio_bitrate=audio_bitrate,
+                )
+        else:
+            shutil.move(video_fp, output_fp)
+    return output_fp
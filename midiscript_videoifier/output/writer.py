@@ -0,0 +1,253 @@
+import subprocess
+import numpy as np
+from pathlib import Path
+from typing import Union, Literal
+from tempfile import TemporaryFile
+from time import perf_counter
+from moviepy import VideoClip
+from moviepy.config import FFMPEG_BINARY
+from .ffmpeg import audio_offset_args, audio_codec_args, resolve_audio_codec
+from ..base.timeline import frame_count
+from .yuv import YUV420Converter
+
+# 由 `YUV420Converter` 转换的画面所对应的色彩标记
+BT709_ARGS = [
+    '-color_range', 'tv', '-colorspace', 'bt709',
+    '-color_primaries', 'bt709', '-color_trc', 'bt709'
+    ]
+
+
+class FFmpegPipeWriter():
+    '''
+    通过原始视频管道把帧直接写给常驻的ffmpeg进程
+
+    与moviepy的 `write_videofile` 相比，没有逐帧的类型检查与迭代器开销；
+    不连续或非uint8的帧会先复制到预先分配的输出缓冲区再写入。
+    支持GPU编码器（h264_nvenc等）与CPU编码器（libx264/libx265及其preset）
+
+    与上一帧的标识（`key` ，如 `CompositeClip.frame_key`）是同一个对象的帧
+    直接重发上一帧已转换好的数据
+    '''
+
+    def __init__(
+            self,
+            output_fp: Union[str, Path],
+            size: tuple[int, int],
+            fps: float,
+            duration: float = None,
+            codec: str = 'libx264',
+            preset: str = None,
+            bitrate: str = None,
+            crf: float = None,
+            pix_fmt: str = 'yuv420p',
+            pipe_pix_fmt: Literal['rgb24', 'yuv420p'] = 'rgb24',
+            threads: int = None,
+            audio_fp: Union[str, Path] = None,
+            audio_offset: float = 0,
+            audio_codec: str = 'auto',
+            audio_bitrate: str = '192k',
+            ffmpeg_params: list[str] = None,
+            report_interval: float = 5,
+        ) -> None:
+        '''
+        Parameters
+        ---
+        size:
+            - 画面尺寸 (w, h)
+        duration:
+            - 视频时长，混入音频时用于对齐音轨长度
+        preset:
+            - 编码器预设，如 libx264 的 `medium` 、h264_nvenc 的 `p7`
+        bitrate:
+            - 目标码率，如 `12000k`
+        crf:
+            - 恒定质量参数（libx264/libx265），与bitrate二选一
+        pix_fmt:
+            - 输出视频的像素格式
+        pipe_pix_fmt:
+            - 管道中传输的像素格式。`yuv420p` 时在写入前用NumPy转换为 BT.709 I420，
+            管道数据量减半，ffmpeg也不再需要做色彩转换（此时输出须为yuv420p）
+        audio_fp:
+            - 同时混入的音频文件，直接在同一个ffmpeg进程中编码
+        audio_offset:
+            - 音频在视频中的起始时间（秒）。为负数时从音频的 `-audio_offset` 处开始
+        audio_codec:
+            - 音频编码器，`auto` 时容器允许则直接复制原音频，否则编码为aac
+        report_interval:
+            - 每隔多少秒打印一次渲染速度，为0时不打印
+        '''
+        self.output_fp = Path(output_fp)
+        self.size = tuple(size)
+        self.fps = fps
+        self.report_interval = report_interval
+        w, h = self.size
+        self.buffer = np.empty((h, w, 3), dtype=np.uint8)
+        self.n_frames = 0
+        self.n_reused = 0
+        self._last_key = None
+        self._last_data: np.ndarray = None
+        cmd = [
+            FFMPEG_BINARY, '-hide_banner', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', pipe_pix_fmt
+            ]
+        if 'yuv420p' == pipe_pix_fmt:
+            if 'yuv420p' != pix_fmt:
+                raise ValueError('pipe_pix_fmt 为 yuv420p 时输出格式也必须是 yuv420p')
+            self.converter = YUV420Converter(self.size)
+            self.yuv_buffer = self.converter.new_buffer()
+            cmd += BT709_ARGS
+        elif 'rgb24' == pipe_pix_fmt:
+            self.converter = None
+        else:
+            raise ValueError(f'不支持的管道像素格式 {pipe_pix_fmt}')
+        cmd += ['-s', f'{w}x{h}', '-r', f'{fps}', '-i', '-']
+        if None is not audio_fp:
+            audio_codec = resolve_audio_codec(
+                audio_fp, self.output_fp, audio_codec
+                )
+            seek, audio_output = audio_offset_args(
+                audio_offset, duration, copy='copy' == audio_codec
+                )
+            cmd += [*seek, '-i', str(audio_fp)]
+            cmd += ['-map', '0:v:0', '-map', '1:a:0', *audio_output]
+            cmd += audio_codec_args(audio_codec, audio_bitrate)
+        else:
+            cmd += ['-an']
+        cmd += ['-c:v', codec, '-pix_fmt', pix_fmt]
+        if None is not self.converter:
+            cmd += BT709_ARGS
+        if None is not preset:
+            cmd += ['-preset', str(preset)]
+        if None is not bitrate:
+            cmd += ['-b:v', str(bitrate)]
+        if None is not crf:
+            cmd += ['-crf', str(crf)]
+        if None is not threads:
+            cmd += ['-threads', str(threads)]
+        cmd += list(ffmpeg_params or [])
+        cmd += [str(self.output_fp)]
+        self.cmd = cmd
+        self._stderr = TemporaryFile()
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr,
+            )
+        self._t0 = perf_counter()
+        self._t_report = self._t0
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self._t0
+
+    @property
+    def throughput(self) -> float:
+        '''
+        从开始到现在的平均渲染速度（帧/秒），包含取帧与编码
+        '''
+        return self.n_frames / max(self.elapsed, 1e-9)
+
+    def _error(self) -> RuntimeError:
+        self.proc.wait()
+        self._stderr.seek(0)
+        log = self._stderr.read().decode(errors='ignore')
+        return RuntimeError(f'ffmpeg 执行失败: {" ".join(self.cmd)}\n{log}')
+
+    def write_frame(self, frame: np.ndarray, key=None) -> None:
+        '''
+        写入一帧 [h,w,3] 的RGB画面（RGBA会丢弃透明通道）
+
+        Parameters
+        ---
+        key:
+            - 画面的标识，与上一帧的标识是同一个对象时不再转换frame，为None时总是转换
+        '''
+        if None is not key and key is self._last_key:
+            data = self._last_data
+            self.n_reused += 1
+        else:
+            if None is not self.converter:
+                data = self.converter.convert(frame, self.yuv_buffer)
+            elif not (
+                    frame.dtype == np.uint8
+                    and frame.shape == self.buffer.shape
+                    and frame.flags.c_contiguous
+                ):
+                np.copyto(self.buffer, frame[:, :, :3], casting='unsafe')
+                data = self.buffer
+            else:
+                data = frame
+            self._last_key, self._last_data = key, data
+        try:
+            self.proc.stdin.write(memoryview(data).cast('B'))
+        except (BrokenPipeError, OSError):
+            raise self._error() from None
+        self.n_frames += 1
+        if self.report_interval:
+            now = perf_counter()
+            if now - self._t_report >= self.report_interval:
+                self._t_report = now
+                print(
+                    f'{self.output_fp.name}: {self.n_frames} frames, '
+                    f'{self.throughput:.1f} fps'
+                    )
+
+    def close(self) -> None:
+        '''
+        结束写入并等待ffmpeg完成编码
+        '''
+        if self.proc.stdin.closed:
+            return
+        try:
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        if self.proc.wait() != 0:
+            raise self._error()
+        self._stderr.close()
+        if self.report_interval:
+            print(
+                f'{self.output_fp.name}: {self.n_frames} frames '
+                f'({self.n_frames - self.n_reused} rendered, '
+                f'{self.n_reused} reused) in '
+                f'{self.elapsed:.1f}s, {self.throughput:.1f} fps'
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if None is exc_type:
+            self.close()
+        else:  # 出错时直接结束ffmpeg，不再等待编码
+            self.proc.kill()
+            self.proc.wait()
+            self._stderr.close()
+
+
+def write_videofile(
+        clip: VideoClip,
+        output_fp: Union[str, Path],
+        fps: float,
+        **kwds
+    ) -> Path:
+    '''
+    `VideoClip.write_videofile` 的替代：逐帧取画面并写入 `FFmpegPipeWriter`
+    帧的时间与moviepy一致，第i帧为 i/fps ，共 `frame_count(duration, fps)` 帧。
+    片段提供 `frame_key` （`CompositeClip` 及其副本）时，与上一帧相同的帧不再转换
+
+    Parameters
+    ---
+    kwds:
+        - 传给 `FFmpegPipeWriter` 的编码参数
+    '''
+    n_frames = frame_count(clip.duration, fps)
+    with FFmpegPipeWriter(
+            output_fp, clip.size, fps, duration=n_frames / fps, **kwds
+        ) as writer:
+        frame_key = getattr(clip, 'frame_key', None)
+        for i in range(n_frames):
+            frame = clip.get_frame(i / fps)
+            writer.write_frame(frame, frame_key() if frame_key else None)
+    return Path(output_fp)
@@ -0,0 +1,122 @@
+import numpy as np
+
+# (Kr, Kb)
+YUV_MATRICES = {
+    'bt709': (0.2126, 0.0722),
+    'bt601': (0.299, 0.114),
+    }
+
+
+class YUV420Converter():
+    '''
+    RGB24 到平面 YUV420p（I420）的向量化转换，默认 BT.709 有限范围
+
+    亮度逐像素计算，色度取 2x2 像素的均值（中心采样），结果四舍五入。
+    中间量使用预先分配的 float32 平面缓冲区，逐帧不再分配内存。
+    输出的字节数是 RGB24 的一半，可直接写入 `-pix_fmt yuv420p` 的原始视频管道
+    '''
+
+    def __init__(
+            self,
+            size: tuple[int, int],
+            matrix: str = 'bt709',
+            full_range: bool = False
+        ) -> None:
+        '''
+        Parameters
+        ---
+        size:
+            - 画面尺寸 (w, h)，必须都是偶数
+        matrix:
+            - 色彩矩阵 `bt709` 或 `bt601`
+        full_range:
+            - 是否使用全范围 [0,255]，默认为有限范围 Y[16,235] UV[16,240]
+        '''
+        w, h = size
+        if w % 2 or h % 2:
+            raise ValueError(f'YUV420p 要求画面尺寸为偶数，当前为 {w}x{h}')
+        self.size = (w, h)
+        self.matrix = matrix
+        self.full_range = full_range
+        kr, kb = YUV_MATRICES[matrix]
+        kg = 1 - kr - kb
+        y_scale, c_scale = (255, 255) if full_range else (219, 224)
+        y_scale, c_scale = y_scale / 255, c_scale / 255
+        self.y_offset = 0 if full_range else 16
+        # 每行为一个输出分量对 R,G,B 的系数
+        self.coefs = np.array([
+            [kr * y_scale, kg * y_scale, kb * y_scale],
+            np.array([-kr, -kg, 1 - kb]) / (2 * (1-kb)) * c_scale,
+            np.array([1 - kr, -kg, -kb]) / (2 * (1-kr)) * c_scale,
+            ], dtype=np.float32)
+        self.frame_bytes = w * h * 3 // 2
+        self._rgb = np.empty((3, h, w), dtype=np.float32)
+        self._acc = np.empty((h, w), dtype=np.float32)
+        self._tmp = np.empty((h, w), dtype=np.float32)
+        self._rows = np.empty((3, h // 2, w), dtype=np.float32)
+        self._sub = np.empty((3, h // 2, w // 2), dtype=np.float32)
+        self._cacc = np.empty((h // 2, w // 2), dtype=np.float32)
+        self._ctmp = np.empty((h // 2, w // 2), dtype=np.float32)
+
+    def new_buffer(self) -> np.ndarray:
+        '''
+        分配一帧 I420 数据的输出缓冲区
+        '''
+        return np.empty(self.frame_bytes, dtype=np.uint8)
+
+    def planes(self, buffer: np.ndarray) -> tuple[np.ndarray]:
+        '''
+        将一帧 I420 缓冲区拆分为 Y [h,w]、U [h/2,w/2]、V [h/2,w/2] 三个视图
+        '''
+        w, h = self.size
+        n_y, n_c = w * h, w * h // 4
+        return (
+            buffer[:n_y].reshape(h, w),
+            buffer[n_y:n_y + n_c].reshape(h // 2, w // 2),
+            buffer[n_y + n_c:].reshape(h // 2, w // 2),
+            )
+
+    def _weighted_sum(self, planes, coefs, offset, acc, tmp, out):
+        np.multiply(planes[0], coefs[0], out=acc)
+        for plane, coef in zip(planes[1:], coefs[1:]):
+            np.multiply(plane, coef, out=tmp)
+            np.add(acc, tmp, out=acc)
+        # 加0.5后截断即四舍五入。有限范围的结果落在 [0.5,255) 内无需截断；
+        # 全范围的饱和色（纯蓝的U、纯红的V）会达到256，须先截断再转换，否则溢出为0
+        np.add(acc, offset + 0.5, out=acc)
+        if self.full_range:
+            np.minimum(acc, 255, out=acc)
+        np.copyto(out, acc, casting='unsafe')
+
+    def convert(self, frame: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        '''
+        将一帧 [h,w,3] uint8 RGB 画面转换为 I420
+
+        Parameters
+        ---
+        frame:
+            - RGB画面，多余的通道会被忽略
+        out:
+            - 可选的输出缓冲区（`new_buffer` 分配），为空时新建
+
+        Return
+        ---
+        一维 uint8 数组：依次为Y、U、V三个平面
+        '''
+        if None is out:
+            out = self.new_buffer()
+        y, u, v = self.planes(out)
+        rgb = self._rgb
+        # 交错的RGB只读取一次，之后都在连续的平面上运算
+        np.copyto(rgb, frame[:, :, :3].transpose(2, 0, 1))
+        self._weighted_sum(
+            rgb, self.coefs[0], self.y_offset, self._acc, self._tmp, y
+            )
+        # 2x2 求和：先合并相邻两行，再合并相邻两列
+        np.add(rgb[:, 0::2], rgb[:, 1::2], out=self._rows)
+        np.add(self._rows[:, :, 0::2], self._rows[:, :, 1::2], out=self._sub)
+        for coefs, plane in zip(self.coefs[1:], (u, v)):
+            self._weighted_sum(
+                self._sub, coefs / 4, 128, self._cacc, self._ctmp, plane
+                )
+        return out
@@ -1,6 +1,8 @@
 from pathlib import Path
 from importlib.util import find_spec
 import numpy as np
+from .blend import LayerBlender, layer_blend
+from .cache import DiskCache, make_key, file_digest, DEFAULT_CACHE_DIR
 
 
 def find_library_path(library_name):
@@ -0,0 +1,203 @@
+import numpy as np
+from typing import Union
+
+
+class LayerBlender():
+    '''
+    基于uint8/uint16定点运算的图层混合器
+
+    与 `layer_mix` 不同，混合结果直接写回目标数组（通常是当前帧的切片），
+    中间量使用按尺寸复用的缓冲区，因此每帧不再产生浮点临时数组
+
+    !Warning 缓冲区为实例私有，同一个实例不要在多个线程中同时使用
+    '''
+
+    def __init__(self) -> None:
+        self._buffers: dict[tuple, np.ndarray] = {}
+
+    def _buffer(self, name: str, shape: tuple, dtype=np.uint16):
+        '''
+        取出（或新建）指定名称与尺寸的缓冲区
+        '''
+        key = (name, shape, np.dtype(dtype).str)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buf
+        return buf
+
+    def alpha_from_mask(self, mask: np.ndarray) -> np.ndarray:
+        '''
+        将moviepy的浮点遮罩 [0,1] 转为 uint8 透明度（四舍五入）
+        '''
+        if mask.dtype == np.uint8:
+            return mask
+        f = self._buffer('mask_f', mask.shape, np.float32)
+        np.multiply(mask, 255, out=f, casting='unsafe')
+        f += 0.5
+        alpha = self._buffer('mask_a', mask.shape, np.uint8)
+        np.copyto(alpha, f, casting='unsafe')
+        return alpha
+
+    def blend(
+            self,
+            dst: np.ndarray,
+            fg: np.ndarray,
+            alpha: np.ndarray = None,
+        ) -> np.ndarray:
+        '''
+        将前景就地混合到dst上
+
+        Parameters
+        ---
+        dst:
+            - uint8 的背景，形如 [h,w,3] 或 [h,w,4] ，会被直接改写
+        fg:
+            - 前景，形如 [h,w,3] 或 [h,w,4] ，非uint8时按截断转换
+        alpha:
+            - 可选的 uint8 透明度 [h,w] 。给出时fg只取前三个通道
+
+        Return
+        ---
+        dst
+        '''
+        if fg.dtype != np.uint8:
+            fg = fg.astype(np.uint8)
+        if alpha is None and fg.shape[2] == 4:
+            alpha = fg[..., 3]
+        rgb = fg[..., :3]
+        if alpha is None:
+            # 无透明通道，直接覆盖
+            dst[..., :3] = rgb
+            if dst.shape[2] == 4:
+                dst[..., 3] = 255
+        elif dst.shape[2] == 3:
+            self._over_rgb(dst, rgb, alpha)
+        else:
+            self._over_rgba(dst, rgb, alpha)
+        return dst
+
+    @staticmethod
+    def prepare_premultiplied(
+            fg: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        将预乘透明度的 uint8 RGBA 前景展开为两个 uint16 [h,w,3] 数组：
+        颜色与 (255 - a) 。  
+        静态图层只需展开一次，之后每帧可以在交错的三个通道上整体运算，
+        比逐通道的跨步运算快得多
+        '''
+        rgb = fg[..., :3].astype(np.uint16)
+        ia = np.empty_like(rgb)
+        np.subtract(255, fg[..., 3:], out=ia[..., :1], dtype=np.uint16)
+        ia[..., 1] = ia[..., 0]
+        ia[..., 2] = ia[..., 0]
+        return rgb, ia
+
+    def blend_premultiplied(
+            self,
+            dst: np.ndarray,
+            fg: Union[np.ndarray, tuple[np.ndarray, np.ndarray]],
+        ) -> np.ndarray:
+        '''
+        将预乘透明度的前景就地叠加到不透明的 RGB 上：
+        out = fg + bg * (255 - a) / 255
+
+        Parameters
+        ---
+        dst:
+            - uint8 的背景 [h,w,3] ，会被直接改写
+        fg:
+            - 预乘透明度的 uint8 前景 [h,w,4] ，
+            或 `prepare_premultiplied` 展开后的结果
+
+        Return
+        ---
+        dst
+        '''
+        if isinstance(fg, np.ndarray):
+            fg = self.prepare_premultiplied(fg)
+        rgb, ia = fg
+        acc = self._buffer('pm_acc', rgb.shape)
+        np.multiply(dst, ia, out=acc)
+        self._div255(acc)
+        np.add(acc, rgb, out=acc)
+        np.copyto(dst, acc, casting='unsafe')
+        return dst
+
+    def _div255(self, acc: np.ndarray):
+        '''
+        对uint16数组就地做四舍五入的 x/255 ，要求 x <= 65025
+        '''
+        tmp = self._buffer('div', acc.shape)
+        np.add(acc, 128, out=acc)
+        np.right_shift(acc, 8, out=tmp)
+        np.add(acc, tmp, out=acc)
+        np.right_shift(acc, 8, out=acc)
+        return acc
+
+    def _over_rgb(self, dst: np.ndarray, rgb: np.ndarray, alpha: np.ndarray):
+        '''
+        RGBA 叠加到不透明的 RGB 上：
+        out = (fg * a + bg * (255 - a)) / 255
+
+        按通道逐个处理：通道切片的最内层是长度为w的跨步循环，
+        比在长度为3的末维上广播快得多
+        '''
+        shape = alpha.shape
+        a = self._buffer('a', shape)
+        ia = self._buffer('ia', shape)
+        acc = self._buffer('acc', shape)
+        tmp = self._buffer('tmp', shape)
+        np.copyto(a, alpha)
+        np.subtract(255, a, out=ia)
+        for c in range(3):
+            np.multiply(rgb[..., c], a, out=acc)
+            np.multiply(dst[..., c], ia, out=tmp)
+            np.add(acc, tmp, out=acc)
+            np.copyto(dst[..., c], self._div255(acc), casting='unsafe')
+
+    def _over_rgba(self, dst: np.ndarray, rgb: np.ndarray, alpha: np.ndarray):
+        '''
+        RGBA 叠加到 RGBA 上（Porter-Duff over，输出非预乘颜色）
+
+        以 255^2 为单位：
+        wf = a_f * 255, wb = a_b * (255 - a_f), a_r = wf + wb
+        out = (fg * wf + bg * wb) / a_r
+        '''
+        shape = alpha.shape
+        wf = self._buffer('wf', shape, np.uint32)
+        wb = self._buffer('wb', shape, np.uint32)
+        a_r = self._buffer('ar', shape, np.uint32)
+        half = self._buffer('half', shape, np.uint32)
+        den = self._buffer('den', shape, np.uint32)
+        acc = self._buffer('acc32', shape, np.uint32)
+        np.multiply(alpha, 255, out=wf, dtype=np.uint32)
+        np.subtract(255, alpha, out=wb, dtype=np.uint32)
+        np.multiply(wb, dst[..., 3], out=wb)
+        np.add(wf, wb, out=a_r)
+        # 四舍五入的整数除法，a_r 为 0 处（完全透明）结果为 0
+        np.right_shift(a_r, 1, out=half)
+        np.maximum(a_r, 1, out=den)
+        for c in range(3):
+            np.multiply(rgb[..., c], wf, out=acc)
+            np.multiply(dst[..., c], wb, out=a_r)
+            np.add(acc, a_r, out=acc)
+            np.add(acc, half, out=acc)
+            np.floor_divide(acc, den, out=acc)
+            np.copyto(dst[..., c], acc, casting='unsafe')
+        # 透明度：a_r / 255 四舍五入
+        np.add(wf, wb, out=a_r)
+        np.add(a_r, 127, out=a_r)
+        np.floor_divide(a_r, 255, out=a_r)
+        np.copyto(dst[..., 3], a_r, casting='unsafe')
+
+
+_default_blender = LayerBlender()
+
+
+def layer_blend(dst: np.ndarray, fg: np.ndarray, alpha: np.ndarray = None):
+    '''
+    使用模块默认的 `LayerBlender` 将fg就地混合到dst上
+    '''
+    return _default_blender.blend(dst, fg, alpha)
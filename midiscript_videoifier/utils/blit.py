@@ -0,0 +1,88 @@
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+class ArtistBlitter():
+    '''
+    matplotlib的局部重绘（blitting）
+
+    初始化时完整绘制一次figure（动态图元不参与），并用 `copy_from_bbox` 保存背景；
+    之后每帧只恢复背景并单独绘制动态图元，不再重新绘制整个figure。
+    动态图元位于最上层时，结果与每帧调用 `fig.canvas.draw()` 逐像素一致
+
+    !Warning `draw` 返回的是画布缓冲区本身（不复制），内容在下一次 `draw` 时被覆盖
+    '''
+
+    def __init__(self, fig: Figure, artists: list[Artist]) -> None:
+        '''
+        Parameters
+        ---
+        fig:
+            - 要绘制的figure，不是Agg画布时（例如已从pyplot中关闭）会换上Agg画布
+        artists:
+            - 逐帧变化的图元，按绘制顺序排列
+        '''
+        self.fig = fig
+        if not isinstance(fig.canvas, FigureCanvasAgg):
+            FigureCanvasAgg(fig)
+        self.canvas = fig.canvas
+        self.artists = list(artists)
+        for artist in self.artists:
+            artist.set_animated(True)
+        self.background = None
+        self.capture()
+
+    def capture(self):
+        '''
+        重新绘制并保存背景，静态内容有变化时需调用
+        '''
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def draw(self) -> np.ndarray:
+        '''
+        恢复背景并绘制动态图元
+
+        Return
+        ---
+        rgba shape[h,w,4]，画布缓冲区的视图
+        '''
+        self.canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+        return np.asarray(self.canvas.buffer_rgba())
+
+
+def timeline_frame_function(
+        fig: Figure,
+        art_timeline: Artist,
+        time2bar,
+        ylim: tuple[float, float],
+    ):
+    '''
+    用局部重绘生成钢琴卷帘时间线的逐帧函数
+
+    Parameters
+    ---
+    art_timeline:
+        - 时间线（`Line2D`）
+    time2bar:
+        - 片段内时间（秒） -> 时间线所在的横坐标
+    ylim:
+        - 时间线的纵向范围
+
+    Return
+    ---
+    frame_function(t) -> rgb shape[h,w,3]，画布缓冲区的视图
+    '''
+    blitter = ArtistBlitter(fig, [art_timeline])
+
+    def frame_function(t: float) -> np.ndarray:
+        x = time2bar(t)
+        art_timeline.set_data([x, x], ylim)
+        return blitter.draw()[:, :, :3]
+
+    frame_function.blitter = blitter
+    return frame_function
@@ -0,0 +1,189 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+from functools import lru_cache
+from pathlib import Path
+from typing import Union
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'midiscript_videoifier'
+
+
+def _feed(h, obj) -> None:
+    '''
+    将对象按确定的格式写入哈希  
+    dict 与 list 保持原有顺序（轨道顺序会影响配色，不能排序）
+    '''
+    if isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        h.update(f'nd{obj.dtype.str}{obj.shape}'.encode())
+        h.update(obj.tobytes())
+    elif isinstance(obj, dict):
+        h.update(b'd%d' % len(obj))
+        for k, v in obj.items():
+            _feed(h, k)
+            _feed(h, v)
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'l%d' % len(obj))
+        for v in obj:
+            _feed(h, v)
+    elif None is obj or isinstance(obj, (str, bytes, bool, int, float)):
+        h.update(f'{type(obj).__name__}:{obj!r};'.encode())
+    elif isinstance(obj, (np.integer, np.floating)):
+        _feed(h, obj.item())
+    elif hasattr(obj, '__dict__'):
+        h.update(type(obj).__name__.encode())
+        _feed(h, {
+            k: v
+            for k, v in vars(obj).items() if not k.startswith('__')
+            })
+    else:
+        h.update(repr(obj).encode())
+
+
+@lru_cache(maxsize=None)
+def _file_digest(fp: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(fp, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(fp: Union[str, Path]) -> str:
+    '''
+    文件内容的sha256（按路径、修改时间和大小缓存，同一文件只读取一次）
+    '''
+    stat = os.stat(fp)
+    return _file_digest(str(fp), stat.st_mtime_ns, stat.st_size)
+
+
+def make_key(*parts) -> str:
+    '''
+    由影响结果的全部内容计算缓存键（sha256）
+    '''
+    h = hashlib.sha256()
+    for part in parts:
+        _feed(h, part)
+    return h.hexdigest()
+
+
+class DiskCache():
+    '''
+    按内容寻址的磁盘数组缓存
+
+    每个条目是一个 `.npy` 文件，命中时可直接以内存映射方式读取。
+    超出容量上限时按最近使用时间（文件的修改时间，命中时会刷新）淘汰。
+    也可以缓存其他类型的文件（如编码好的视频片段），此时用 `lookup` 取得路径
+    '''
+
+    def __init__(
+            self,
+            root: Union[str, Path],
+            max_bytes: int = None,
+            suffix: str = '.npy',
+        ) -> None:
+        '''
+        Parameters
+        ---
+        root:
+            - 缓存目录
+        max_bytes:
+            - 容量上限（字节），为空时不限制
+        suffix:
+            - 条目文件的扩展名
+        '''
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / f'{key}{self.suffix}'
+
+    def _touch(self, fp: Path) -> None:
+        try:
+            os.utime(fp)
+        except OSError:
+            pass
+
+    def lookup(self, key: str) -> Union[Path, None]:
+        '''
+        查找缓存的文件，命中时返回其路径，未命中时返回None
+        '''
+        fp = self.path(key)
+        if not fp.is_file():
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(fp)
+        return fp
+
+    def load(self, key: str, mmap_mode: str = 'r') -> Union[np.ndarray, None]:
+        '''
+        读取缓存，未命中时返回None
+        '''
+        fp = self.path(key)
+        try:
+            array = np.load(fp, mmap_mode=mmap_mode)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(fp)
+        return array
+
+    def save(self, key: str, array: np.ndarray) -> Path:
+        '''
+        写入缓存（先写临时文件再替换，避免并发写入时读到残缺文件）
+        '''
+        fp = self.path(key)
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        tmp_fp = fp.with_name(f'{key}.{os.getpid()}.tmp')
+        with open(tmp_fp, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_fp, fp)
+        self.evict()
+        return fp
+
+    def store_file(self, key: str, src_fp: Union[str, Path]) -> Path:
+        '''
+        将已经写好的文件移入缓存（同一文件系统下不会复制数据）
+        '''
+        fp = self.path(key)
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(src_fp, fp)
+        except OSError:  # 跨文件系统
+            shutil.move(src_fp, fp)
+        self.evict()
+        return fp
+
+    def evict(self) -> None:
+        '''
+        淘汰最久未使用的条目，直到总大小不超过上限
+        '''
+        if None is self.max_bytes:
+            return
+        entries = []
+        for fp in self.root.glob(f'*/*{self.suffix}'):
+            try:
+                stat = fp.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fp))
+        total = sum(size for _, size, _ in entries)
+        for _, size, fp in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                fp.unlink()
+            except OSError:  # 可能正被其他进程映射
+                continue
+            total -= size
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class NoteIndex():
+    '''
+    单条轨道音符表的区间查询索引
+
+    音符按开始时间排序，并记录排序后结束时间的前缀最大值。
+    开始时间早于查询终点的音符是排序后的一段前缀，
+    其中前缀最大值首次超过查询起点之前的音符都已经结束，
+    因此只需在剩下的候选音符上按原条件判断
+    '''
+
+    def __init__(self, mtrack: np.ndarray) -> None:
+        self.mtrack = mtrack
+        self.order = np.argsort(mtrack[:, 2], kind='stable')
+        self.starts = mtrack[self.order, 2]
+        self.max_ends = np.maximum.accumulate(mtrack[self.order, 3]) if (
+            len(mtrack)
+            ) else mtrack[:0, 3]
+
+    def query(
+            self,
+            start: float,
+            end: float,
+            low: float,
+            high: float
+        ) -> np.ndarray:
+        '''
+        选出终点在start之后、起点在end之前、音高在 (low, high) 之间的音符，
+        结果及其顺序与对整张表做布尔筛选完全一致
+        '''
+        # 查询值先舍入到表的精度，并取闭区间，保证候选是原条件结果的超集
+        dtype = self.starts.dtype.type
+        i1 = np.searchsorted(self.starts, dtype(end), 'right')
+        i0 = np.searchsorted(self.max_ends[:i1], dtype(start), 'left')
+        candidates = self.mtrack[np.sort(self.order[i0:i1])]
+        return candidates[(candidates[:, 3] > start)
+                          & (candidates[:, 2] < end)
+                          & (candidates[:, 0] > low)
+                          & (candidates[:, 0] < high)]
@@ -1,33 +1,111 @@
 from midiscript_videoifier import *
-import melody_machine as mm
+from midiscript_videoifier.configs.default import CONFIG
 from pathlib import Path
-import sys
+import argparse
 
 if __name__ == '__main__':
-    args = sys.argv
-    fp = args[-1]
-    fp = Path(fp)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('script', help='手稿路径')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='渲染进程数，大于1时按时间分段并行渲染后无损拼接'
+        )
+    parser.add_argument(
+        '--draft',
+        action='store_true',
+        help='草稿模式：缩小画面、降低帧率并使用draft编码档位，用于快速预览'
+        )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='按文本段落分段缓存编码结果，只重新渲染有变化的段'
+        )
+    parser.add_argument(
+        '--profile',
+        choices=list(PROFILES),
+        default=None,
+        help='编码档位，默认使用手稿中的 encoder_profile'
+        )
+    parser.add_argument(
+        '--codec', default=None, help='视频编码器，覆盖档位中的设置，如 libx264'
+        )
+    parser.add_argument('--preset', default=None, help='编码器预设')
+    parser.add_argument('--bitrate', default=None, help='视频码率')
+    parser.add_argument('--crf', type=float, default=None, help='恒定质量参数')
+    parser.add_argument('--threads', type=int, default=None, help='编码线程数')
+    parser.add_argument(
+        '--pipe-yuv',
+        action='store_true',
+        help='在写入管道前转换为 BT.709 YUV420p ，管道数据量减半'
+        )
+    args = parser.parse_args()
+    fp = Path(args.script)
     script = Script(file_path=fp)
     # midi_fp = script.session_data['midi_fp']
     # audio_fp = script.session_data['audio_fp']
     output_fp = fp.parent / (fp.stem + '.mp4')
-    output_fp = script.session_data.get('output_fp', output_fp)
-    song = mm.Song(script.session_data['midi_fp'], **script.session_data)
-    mov = Movie(song=song, **script.session_data)
-    print(mov.__dict__)
-    mov.arr_clip.clear()
-    mov.make_section_Title()
-    mov.make_section_CountDown()
-    mov.make_section_Para(script.paragraphs)
-    mov.make_section_Midi(script.midi_patterns)
-    mov.make_section_Background()
-    comp_vc = mov.generate_movie()
-    comp_vc.write_videofile(
-        output_fp,
-        audio_bitrate='192k',
-        fps=60,
-        threads=6,
-        codec='h264_nvenc',
-        bitrate=f'{12000}k',
-        preset='p7',
-        )
+    output_fp = Path(script.session_data.get('output_fp', output_fp))
+    fps = 60
+    movie_kwds = {}
+    profile_name = script.session_data.get('encoder_profile', 'final')
+    target_psnr = script.session_data.get('encoder_target_psnr')
+    # 命令行与手稿中任一处开启草稿模式时，帧率、编码档位与输出文件名都随之切换
+    draft = args.draft or script.session_data.get('draft', CONFIG.draft)
+    if draft:
+        fps = script.session_data.get('draft_fps', CONFIG.draft_fps)
+        movie_kwds['draft'] = True
+        profile_name, target_psnr = 'draft', None
+        output_fp = output_fp.with_name(output_fp.stem + '_draft.mp4')
+    if args.profile is None and target_psnr:
+        # 用真实画面试编码，选择满足画质的最快档位
+        comp_vc = Movie.from_script(script).generate_movie(fps=fps)
+        profile = calibrate_profile(comp_vc, target_psnr, fps=fps)
+    else:
+        profile = select_profile(args.profile or profile_name)
+    write_params = profile.writer_kwds()
+    if None is not args.codec and args.codec != profile.codec:
+        # 换了编码器时档位的预设不再适用
+        write_params.update(preset=None, threads=None)
+    for k in ['codec', 'preset', 'bitrate', 'crf', 'threads']:
+        if None is not getattr(args, k):
+            write_params[k] = getattr(args, k)
+    if None is not args.crf:
+        write_params['bitrate'] = None
+    elif None is not args.bitrate:
+        write_params['crf'] = None
+    write_params['pipe_pix_fmt'] = 'yuv420p' if args.pipe_yuv else 'rgb24'
+    if args.incremental:
+        render_incremental(
+            fp,
+            output_fp,
+            fps=fps,
+            workers=args.workers,
+            movie_kwds=movie_kwds,
+            audio_bitrate='192k',
+            **write_params,
+            )
+    elif args.workers > 1:
+        render_parallel(
+            fp,
+            output_fp,
+            workers=args.workers,
+            fps=fps,
+            movie_kwds=movie_kwds,
+            audio_bitrate='192k',
+            **write_params,
+            )
+    else:
+        mov = Movie.from_script(script, **movie_kwds)
+        print(mov.__dict__)
+        comp_vc = mov.generate_movie(fps=fps)
+        write_videofile(
+            comp_vc,
+            output_fp,
+            fps=fps,
+            audio_fp=mov.audio_fp,
+            audio_offset=mov.get_audio_offset(),
+            audio_bitrate='192k',
+            **write_params,
+            )